@@ -0,0 +1,212 @@
+"""Índice en memoria para autocompletar nombres de productos.
+
+Cada worker guarda los nombres de los productos activos normalizados (sin
+tildes, en minúsculas y con los espacios colapsados) en una lista ordenada.
+Buscar un prefijo es una búsqueda binaria (`bisect`) más recorrer las `k`
+claves siguientes que empiezan por él, sin consultar la BD.
+
+El índice se carga al arrancar y se mantiene al día con los eventos de
+productos del bus de invalidación, que ya publican todas las funciones de
+escritura (y llegan también desde otros workers con el backend "db").
+"""
+
+import sys
+import threading
+import time
+import unicodedata
+from bisect import bisect_left, insort
+from dataclasses import dataclass
+
+from . import models
+from .database import SessionLocal
+from .invalidation import ChangeEvent, invalidation_bus
+
+# Separa en cada clave el nombre normalizado del id (la normalización cambia
+# los caracteres de control por espacios, así que no aparece en el nombre).
+_SEPARATOR = "\x00"
+_CONTROL_CHARS = dict.fromkeys([*range(0x20), *range(0x7F, 0xA0)], " ")
+_LOAD_BATCH_SIZE = 10_000
+# Versión que se anota al borrar un producto: ningún evento posterior lo revive.
+_DELETED = sys.maxsize
+
+
+def normalize(text: str) -> str:
+    """Sin tildes ni mayúsculas y con un solo espacio entre palabras."""
+    if not text.isascii():
+        # NFKD separa cada tilde de su letra (á -> a + ´) y se descartan las tildes.
+        text = "".join(
+            char
+            for char in unicodedata.normalize("NFKD", text)
+            if not unicodedata.combining(char)
+        )
+    return " ".join(text.translate(_CONTROL_CHARS).casefold().split())
+
+
+@dataclass(frozen=True)
+class Suggestion:
+    product_id: int
+    name: str
+
+
+class ProductNameIndex:
+    def __init__(self) -> None:
+        self.enabled = False
+        self._lock = threading.Lock()
+        # Claves `nombre_normalizado\x00product_id`, ordenadas.
+        self._keys: list[str] = []
+        # product_id -> nombre tal cual, para devolverlo en las sugerencias.
+        self._names: dict[int, str] = {}
+        # product_id -> última versión aplicada (también inactivos y borrados):
+        # los eventos pueden llegar desordenados y los atrasados se descartan.
+        self._versions: dict[int, int] = {}
+        # Eventos recibidos mientras se carga desde la BD.
+        self._pending: list[ChangeEvent] | None = None
+        self._ready = False
+        self._built_at: float | None = None
+        self._build_seconds: float | None = None
+        self._updates = 0
+        invalidation_bus.subscribe(self._on_change)
+
+    # --- Carga ---
+
+    def start(self) -> None:
+        """Carga el índice en segundo plano; hasta entonces no está `ready`."""
+        self.enabled = True
+        threading.Thread(
+            target=self._build_logged, name="autocomplete-index", daemon=True
+        ).start()
+
+    def stop(self) -> None:
+        self.enabled = False
+
+    def _build_logged(self) -> None:
+        try:
+            self.build()
+        except Exception as exc:
+            print(f"--> Error al cargar el índice de autocompletado: {exc}")
+
+    def build(self) -> None:
+        """Carga desde la BD los nombres de todos los productos activos."""
+        started = time.perf_counter()
+        with self._lock:
+            self._pending = []
+
+        names: dict[int, str] = {}
+        # Versiones de todos los productos (también inactivos) en la lectura.
+        versions: dict[int, int] = {}
+        db = SessionLocal()
+        try:
+            rows = db.query(
+                models.Product.product_id,
+                models.Product.name,
+                models.Product.active,
+                models.Product.version,
+            ).execution_options(yield_per=_LOAD_BATCH_SIZE)
+            for product_id, name, active, version in rows:
+                versions[product_id] = version
+                if active:
+                    names[product_id] = name
+        except BaseException:
+            with self._lock:
+                self._pending = None
+            raise
+        finally:
+            db.close()
+
+        keys = sorted(_key(name, product_id) for product_id, name in names.items())
+        with self._lock:
+            self._keys = keys
+            self._names = names
+            self._versions = versions
+            # Lo que cambió durante la carga se aplica encima; la versión
+            # descarta los eventos que la lectura ya incluía.
+            pending, self._pending = self._pending, None
+            for change in pending:
+                self._apply(change)
+            self._ready = True
+            self._built_at = time.time()
+            self._build_seconds = time.perf_counter() - started
+
+    # --- Cambios ---
+
+    def _on_change(self, change: ChangeEvent) -> None:
+        if not self.enabled or change.entity != "product":
+            return
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append(change)
+            else:
+                self._apply(change)
+
+    def _apply(self, change: ChangeEvent) -> None:
+        product_id = change.entity_id
+        current = self._names.get(product_id)
+        if change.action == "delete":
+            self._versions[product_id] = _DELETED
+            if current is not None:
+                self._remove(product_id, current)
+            return
+        if change.data is None:
+            return
+        version = change.data.get("version", change.version)
+        if version is not None:
+            if version <= self._versions.get(product_id, 0):
+                return  # Atrasado (o de un producto ya borrado).
+            self._versions[product_id] = version
+
+        name, active = change.data.get("name"), change.data.get("active")
+        if active and current == name:
+            return  # Cambio de stock, precio...: el nombre sigue igual.
+        if current is not None:
+            self._remove(product_id, current)
+        if active and name:
+            insort(self._keys, _key(name, product_id))
+            self._names[product_id] = name
+            self._updates += 1
+
+    def _remove(self, product_id: int, name: str) -> None:
+        key = _key(name, product_id)
+        position = bisect_left(self._keys, key)
+        if position < len(self._keys) and self._keys[position] == key:
+            del self._keys[position]
+        del self._names[product_id]
+        self._updates += 1
+
+    # --- Búsqueda ---
+
+    @property
+    def ready(self) -> bool:
+        return self._ready
+
+    def search(self, prefix: str, limit: int) -> list[Suggestion]:
+        """Hasta `limit` productos activos cuyo nombre empieza por `prefix`."""
+        normalized = normalize(prefix)
+        if not normalized:
+            return []
+        results = []
+        with self._lock:
+            position = bisect_left(self._keys, normalized)
+            for key in self._keys[position : position + limit]:
+                if not key.startswith(normalized):
+                    break
+                product_id = int(key.rpartition(_SEPARATOR)[2])
+                results.append(Suggestion(product_id, self._names[product_id]))
+        return results
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "ready": self._ready,
+                "names": len(self._keys),
+                "updates": self._updates,
+                "built_at": self._built_at,
+                "build_seconds": self._build_seconds,
+            }
+
+
+def _key(name: str, product_id: int) -> str:
+    return f"{normalize(name)}{_SEPARATOR}{product_id}"
+
+
+product_name_index = ProductNameIndex()
@@ -0,0 +1,262 @@
+"""Snapshot precalculado del catálogo activo.
+
+Un hilo de fondo escucha en el bus de invalidación los cambios de productos y,
+tras un periodo sin escrituras (`catalog_snapshot_debounce_seconds`, como
+mucho `catalog_snapshot_max_delay_seconds` desde el primer cambio), vuelve a
+generar un archivo JSON con todos los productos activos (y su versión gzip).
+
+Los archivos llevan la versión (hash del contenido) en el nombre y se publican
+de forma atómica reescribiendo `current.json`. Los workers que comparten el
+directorio se coordinan con un bloqueo de archivo: si otro ya generó un
+snapshot que empezó después del último cambio visto, no se repite.
+
+Para servirlo, cada worker mapea en memoria (mmap) la versión actual y
+responde con porciones de ese mapa, sin consultar la BD.
+"""
+
+import gzip
+import hashlib
+import json
+import mmap
+import os
+import threading
+import time
+from dataclasses import dataclass
+
+from .config import settings
+from .database import SessionLocal
+from .file_io import lock_file, write_atomic
+from .invalidation import ChangeEvent, invalidation_bus
+from .services import product_service
+
+_POINTER_NAME = "current.json"
+_LOCK_NAME = ".build.lock"
+# Versiones anteriores que se conservan para las descargas aún en curso.
+_KEEP_PREVIOUS = 2
+
+
+@dataclass(frozen=True)
+class LoadedSnapshot:
+    version: str
+    count: int
+    built_at: float
+    next_token: str
+    body: memoryview
+    gzip_body: memoryview | None
+
+
+def _map_file(path: str) -> memoryview:
+    with open(path, "rb") as snapshot_file:
+        # El mapa sigue siendo válido tras cerrar el archivo (y tras borrarlo).
+        return memoryview(mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ))
+
+
+class CatalogSnapshotBuilder:
+    def __init__(self) -> None:
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._dirty_since: float | None = None
+        self._last_change = 0.0
+        self._builds = 0
+        self._skipped = 0
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._loaded: LoadedSnapshot | None = None
+        self._loaded_stamp: tuple[int, int] | None = None
+        invalidation_bus.subscribe(self._on_change)
+
+    # --- Ciclo de vida ---
+
+    def start(self) -> None:
+        os.makedirs(settings.catalog_snapshot_dir, exist_ok=True)
+        self.enabled = True
+        # Al arrancar se comprueba que exista un snapshot al día.
+        self._mark_dirty(time.time())
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="catalog-snapshot-builder", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        if not self.enabled:
+            return
+        self.enabled = False
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    # --- Cambios y espera con debounce ---
+
+    def _on_change(self, change: ChangeEvent) -> None:
+        if self.enabled and change.entity == "product":
+            self._mark_dirty(time.time())
+
+    def _mark_dirty(self, changed_at: float) -> None:
+        with self._lock:
+            if self._dirty_since is None:
+                self._dirty_since = changed_at
+            self._last_change = max(self._last_change, changed_at)
+        self._wakeup.set()
+
+    def _seconds_until_due(self) -> float | None:
+        """None si no hay cambios pendientes; 0 si ya toca regenerar."""
+        with self._lock:
+            if self._dirty_since is None:
+                return None
+            now = time.time()
+            quiet_until = self._last_change + settings.catalog_snapshot_debounce_seconds
+            deadline = self._dirty_since + settings.catalog_snapshot_max_delay_seconds
+            return max(min(quiet_until, deadline) - now, 0.0)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            wait = self._seconds_until_due()
+            if wait is None or wait > 0:
+                self._wakeup.wait(wait)
+                self._wakeup.clear()
+                continue
+
+            with self._lock:
+                changed_at = self._last_change
+                self._dirty_since = None
+            try:
+                self.build(changed_at)
+            except Exception as exc:
+                print(f"--> Error al generar el snapshot del catálogo, se reintentará: {exc}")
+                self._mark_dirty(changed_at)
+                self._stop.wait(settings.catalog_snapshot_debounce_seconds)
+
+    # --- Generación ---
+
+    def build(self, changed_at: float = 0.0) -> str | None:
+        """Genera y publica un snapshot; None si otro worker ya lo hizo."""
+        directory = settings.catalog_snapshot_dir
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, _LOCK_NAME), "a") as build_lock:
+            lock_file(build_lock)
+
+            pointer = self._read_pointer()
+            if pointer is not None and pointer["started_at"] > changed_at:
+                self._skipped += 1
+                return None
+
+            started_at = time.time()
+            db = SessionLocal()
+            try:
+                snapshot = product_service.get_catalog_snapshot(db)
+            finally:
+                db.close()
+
+            body = snapshot.model_dump_json().encode()
+            version = hashlib.sha256(body).hexdigest()[:16]
+            filename = f"catalog-{version}.json"
+            write_atomic(os.path.join(directory, filename), body)
+            gzip_filename = None
+            if settings.catalog_snapshot_gzip:
+                gzip_filename = f"{filename}.gz"
+                write_atomic(
+                    os.path.join(directory, gzip_filename),
+                    gzip.compress(body, compresslevel=6, mtime=0),
+                )
+
+            pointer = {
+                "version": version,
+                "file": filename,
+                "gzip_file": gzip_filename,
+                "count": len(snapshot.products),
+                "next_token": snapshot.next_token,
+                "started_at": started_at,
+                "built_at": time.time(),
+            }
+            write_atomic(
+                os.path.join(directory, _POINTER_NAME), json.dumps(pointer).encode()
+            )
+            self._prune(directory, pointer)
+            self._builds += 1
+            return version
+
+    @staticmethod
+    def _prune(directory: str, pointer: dict) -> None:
+        snapshots = sorted(
+            (
+                entry
+                for entry in os.scandir(directory)
+                if entry.name.startswith("catalog-") and entry.name.endswith(".json")
+            ),
+            key=lambda entry: entry.stat().st_mtime,
+            reverse=True,
+        )
+        for entry in snapshots[_KEEP_PREVIOUS + 1 :]:
+            if entry.name == pointer["file"]:
+                continue
+            for path in (entry.path, f"{entry.path}.gz"):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    # --- Lectura ---
+
+    @staticmethod
+    def _read_pointer() -> dict | None:
+        try:
+            with open(os.path.join(settings.catalog_snapshot_dir, _POINTER_NAME), "rb") as f:
+                return json.loads(f.read())
+        except FileNotFoundError:
+            return None
+
+    def current(self) -> LoadedSnapshot | None:
+        """Snapshot publicado más reciente, mapeado en memoria."""
+        pointer_path = os.path.join(settings.catalog_snapshot_dir, _POINTER_NAME)
+        try:
+            stat = os.stat(pointer_path)
+        except FileNotFoundError:
+            return None
+        stamp = (stat.st_mtime_ns, stat.st_ino)
+        if stamp == self._loaded_stamp:
+            return self._loaded
+
+        pointer = self._read_pointer()
+        directory = settings.catalog_snapshot_dir
+        try:
+            body = _map_file(os.path.join(directory, pointer["file"]))
+            gzip_body = (
+                _map_file(os.path.join(directory, pointer["gzip_file"]))
+                if pointer["gzip_file"]
+                else None
+            )
+        except FileNotFoundError:
+            # Se publicó una versión nueva entre medias: se usará en la próxima.
+            return self._loaded
+
+        self._loaded = LoadedSnapshot(
+            version=pointer["version"],
+            count=pointer["count"],
+            built_at=pointer["built_at"],
+            next_token=pointer["next_token"],
+            body=body,
+            gzip_body=gzip_body,
+        )
+        self._loaded_stamp = stamp
+        return self._loaded
+
+    def stats(self) -> dict:
+        pointer = self._read_pointer()
+        with self._lock:
+            pending = self._dirty_since is not None
+        return {
+            "enabled": self.enabled,
+            "pending_rebuild": pending,
+            "builds": self._builds,
+            "skipped_builds": self._skipped,
+            "version": pointer["version"] if pointer else None,
+            "count": pointer["count"] if pointer else None,
+            "built_at": pointer["built_at"] if pointer else None,
+        }
+
+
+catalog_snapshot = CatalogSnapshotBuilder()
@@ -1,3 +1,7 @@
+from decimal import Decimal
+from typing import Literal
+
+from pydantic import model_validator
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -5,11 +9,184 @@ class Settings(BaseSettings):
     jwt_secret: str
     jwt_expires_in: str
     jwt_algorithm: str = "HS256"
+
+    # --- Pool de conexiones (por engine: principal y réplica) ---
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_replica_pool_size: int = 5
+    db_replica_max_overflow: int = 10
+    # Conexiones de la principal que no se dan a peticiones: las usan los hilos
+    # de fondo (buffer de stock, barrido de reservas, snapshot, bus...).
+    db_pool_reserved: int = 3
+
+    # --- Réplica de lectura (opcional) ---
+    # Si no se define, todas las lecturas van a la base de datos principal.
+    database_replica_url: str | None = None
+    replica_health_check_interval: float = 5.0
+    # Segundos máximos para abrir una conexión con la réplica (MySQL).
+    replica_connect_timeout: int = 2
+    # Segundos durante los que un cliente que acaba de escribir lee de la
+    # principal (read-your-writes) para no ver datos atrasados de la réplica.
+    read_your_writes_window: float = 5.0
+
+    # --- Tiempo máximo por consulta (solo sesiones de peticiones) ---
+    # Milisegundos; 0 = sin límite. En MySQL se aplica a los SELECT con la pista
+    # MAX_EXECUTION_TIME; en SQLite se emula interrumpiendo la sentencia.
+    statement_timeout_ms: int = 5000
+    # Excepciones por ruta (la ruta tal como está declarada en el router).
+    statement_timeout_overrides: dict[str, int] = {
+        "/products/changes": 15000,
+        "/products/facets": 10000,
+        "/reports/inventory": 15000,
+    }
+
+    # --- Cortacircuitos de la BD ---
+    # Tras estos errores operativos seguidos (tiempos agotados, conexiones
+    # caídas...) se responde 503 sin consultar la BD durante `db_breaker_open_seconds`.
+    db_breaker_enabled: bool = True
+    db_breaker_failure_threshold: int = 5
+    db_breaker_open_seconds: float = 10.0
+
+    # --- Buffer de incrementos de stock (opcional) ---
+    # Si se activa, PATCH /products/{id}/stock se confirma al quedar escrito en
+    # un diario local y un hilo aplica los incrementos agrupados por producto.
+    stock_buffer_enabled: bool = False
+    stock_buffer_journal_dir: str = "stock_journal"
+    stock_buffer_flush_interval: float = 1.0
+    # Máximo de incrementos pendientes antes de forzar un volcado inmediato.
+    stock_buffer_max_pending: int = 1000
+
+    # --- Bus de invalidación de cachés entre workers ---
+    # "db": se registra cada cambio en la tabla change_log y cada worker la
+    # consulta periódicamente. "local": solo el propio proceso (un único worker).
+    invalidation_backend: Literal["local", "db"] = "db"
+    invalidation_poll_interval: float = 0.5
+    invalidation_retention_seconds: int = 3600
+
+    # --- Sincronización incremental (GET /products/changes) ---
+    # Solo se entregan cambios con esta antigüedad mínima, para no saltarse
+    # filas confirmadas tarde con el mismo `updated_at` (precisión de segundos).
+    sync_settle_seconds: float = 2.0
+
+    # --- Eventos de productos en tiempo real (SSE) ---
+    sse_subscriber_buffer: int = 100
+    sse_history_size: int = 1000
+    sse_keepalive_seconds: float = 15.0
+    sse_max_stream_seconds: float = 300.0
+
+    # --- Imágenes de productos almacenadas localmente ---
+    media_root: str = "media"
+    image_max_bytes: int = 5 * 1024 * 1024
+    # Lado máximo (px) de cada miniatura que se genera al subir una imagen.
+    image_variant_sizes: list[int] = [128, 400, 800]
+    # Variante que se guarda en `imagen_url` del producto.
+    image_default_variant: int = 400
+    # URL pública del servicio (p. ej. detrás de un proxy). Si no se define se
+    # usa la URL con la que llegó la petición.
+    public_base_url: str | None = None
+
+    # --- Control de admisión delante del pool de conexiones ---
+    # Sin valor, los límites se reparten las conexiones del pool de la
+    # principal no reservadas (un tercio para escrituras); ver `_fit_admission_to_pool`.
+    admission_enabled: bool = True
+    admission_read_limit: int | None = None
+    admission_write_limit: int | None = None
+    # Peticiones que pueden esperar turno; por encima se responde 503.
+    admission_read_queue: int = 32
+    admission_write_queue: int = 16
+    admission_queue_timeout: float = 1.0
+    admission_retry_after: int = 1
+    admission_paths: list[str] = ["/products", "/categories", "/reports", "/reservations"]
+    # Rutas que no usan la BD (no deben ocupar un turno).
+    admission_exempt_paths: list[str] = [
+        "/products/events",
+        "/products/snapshot",
+        "/products/autocomplete",
+    ]
+
+    # --- Reservas de stock durante el checkout ---
+    reservation_default_ttl_seconds: int = 600
+    reservation_max_ttl_seconds: int = 3600
+    reservation_sweep_interval: float = 5.0
+    reservation_sweep_batch_size: int = 500
+    # Las reservas cerradas (confirmadas, liberadas o caducadas) se purgan después de esto.
+    reservation_retention_seconds: int = 7 * 24 * 3600
+
+    # --- Totales para paginación (X-Total-Count) ---
+    # Antigüedad máxima de un total en caché.
+    total_count_max_staleness_seconds: float = 30.0
+
+    # --- Conteos por faceta (GET /products/facets) ---
+    # Límites de los rangos de precio: menos de 10, [10, 50), ..., 500 o más.
+    facet_price_bounds: list[Decimal] = [Decimal(10), Decimal(50), Decimal(100), Decimal(500)]
+    # Los conteos en caché se descartan con cada cambio de productos o
+    # categorías y, como mucho, tras este tiempo (p. ej. por atraso de la réplica).
+    facet_cache_max_age_seconds: float = 60.0
+
+    # --- Snapshot precalculado del catálogo activo ---
+    catalog_snapshot_enabled: bool = True
+    catalog_snapshot_dir: str = "catalog_snapshot"
+    # Se regenera tras este tiempo sin cambios de productos...
+    catalog_snapshot_debounce_seconds: float = 2.0
+    # ...pero nunca más tarde que esto desde el primer cambio pendiente.
+    catalog_snapshot_max_delay_seconds: float = 30.0
+    catalog_snapshot_gzip: bool = True
+
+    # --- Autocompletado de nombres de productos (índice en memoria) ---
+    autocomplete_enabled: bool = True
+    # Máximo de sugerencias que se pueden pedir por consulta.
+    autocomplete_max_results: int = 20
+
+    # --- Perfilado bajo demanda (cabecera X-Profile: 1 con token o muestreo) ---
+    profiling_enabled: bool = False
+    # Perfilar una de cada N peticiones (0 = solo bajo demanda).
+    profiling_sample_rate: int = 0
+    profiling_dir: str = "profiles"
+    # Perfiles que se conservan; al superar el límite se borran los más antiguos.
+    profiling_max_files: int = 50
     
 
+    @model_validator(mode="after")
+    def _fit_admission_to_pool(self) -> "Settings":
+        """Las peticiones admitidas deben caber en el pool, o esperarían dentro de él.
+
+        Las lecturas pueden caer a la principal (read-your-writes, réplica caída),
+        así que lecturas + escrituras caben en la principal y, si hay réplica,
+        las lecturas también caben en la suya.
+        """
+        slots = self.db_pool_size + self.db_max_overflow - self.db_pool_reserved
+        if slots < 2:
+            raise ValueError(
+                "El pool de la BD es demasiado pequeño: db_pool_size + db_max_overflow "
+                "debe superar db_pool_reserved en al menos 2."
+            )
+        read_capacity = slots
+        if self.database_replica_url:
+            read_capacity = min(
+                read_capacity, self.db_replica_pool_size + self.db_replica_max_overflow
+            )
+
+        if self.admission_write_limit is None:
+            self.admission_write_limit = max(slots // 3, 1)
+        if self.admission_read_limit is None:
+            self.admission_read_limit = min(slots - self.admission_write_limit, read_capacity)
+
+        if self.admission_read_limit + self.admission_write_limit > slots:
+            raise ValueError(
+                f"admission_read_limit + admission_write_limit ({self.admission_read_limit} + "
+                f"{self.admission_write_limit}) supera las {slots} conexiones del pool "
+                "disponibles para peticiones (db_pool_size + db_max_overflow - db_pool_reserved)."
+            )
+        if self.admission_read_limit > read_capacity:
+            raise ValueError(
+                f"admission_read_limit ({self.admission_read_limit}) supera las "
+                f"{read_capacity} conexiones del pool de la réplica."
+            )
+        return self
+
     class Config:
         env_file = ".env"
         env_file_encoding = "utf-8"
 
 
-settings = Settings()
\ No newline at end of file
+settings = Settings()
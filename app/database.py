@@ -1,13 +1,29 @@
-from sqlalchemy import create_engine
+import threading
+import time
+from typing import Any
+
+from fastapi import Request, Response
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from app.config import settings
+from app.db_guard import (
+    DB_FAILURES,
+    CircuitBreaker,
+    counts_as_failure,
+    install_statement_timeouts,
+    set_statement_timeout,
+    statement_timeout_for,
+)
 import os
 
-# --- LÓGICA SSL PARA AIVEN ---
-connect_args = {}
 
-if "aivencloud.com" in settings.database_url:
+def _build_connect_args(database_url: str) -> dict:
+    # --- LÓGICA SSL PARA AIVEN ---
+    if "aivencloud.com" not in database_url:
+        return {}
+
     # 1. Primero intentamos buscar en la ruta de secretos de Render
     render_secret_path = "/etc/secrets/ca.pem"
     
@@ -20,26 +36,179 @@ if "aivencloud.com" in settings.database_url:
         ssl_ca_path = os.path.join(os.path.dirname(__file__), "ca.pem")
         print(f"--> Usando certificado Local: {ssl_ca_path}")
     
-    connect_args = {
+    return {
         "ssl": {
             "ca": ssl_ca_path
         }
     }
 
+
 # --- CREAR EL ENGINE CON ARGUMENTOS SSL ---
 engine = create_engine(
     settings.database_url, 
-    connect_args=connect_args
+    connect_args=_build_connect_args(settings.database_url),
+    # Tamaño explícito: los límites del control de admisión se calculan con él.
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
 )
 
+install_statement_timeouts(engine)
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# --- ENGINE DE LA RÉPLICA DE LECTURA (OPCIONAL) ---
+replica_engine = None
+ReplicaSessionLocal = None
+
+if settings.database_replica_url:
+    replica_connect_args = _build_connect_args(settings.database_replica_url)
+    if make_url(settings.database_replica_url).get_backend_name() == "mysql":
+        # Sin esto, una réplica que no responde retiene la comprobación de
+        # salud durante todo el timeout TCP.
+        replica_connect_args["connect_timeout"] = settings.replica_connect_timeout
+    replica_engine = create_engine(
+        settings.database_replica_url,
+        connect_args=replica_connect_args,
+        pool_pre_ping=True,
+        pool_size=settings.db_replica_pool_size,
+        max_overflow=settings.db_replica_max_overflow,
+    )
+    install_statement_timeouts(replica_engine)
+    ReplicaSessionLocal = sessionmaker(
+        autocommit=False, autoflush=False, bind=replica_engine
+    )
+
+def in_lock_order(rows: dict[int, Any]) -> list[tuple[int, Any]]:
+    """Pares `(id, valor)` ordenados por id, para actualizar varias filas.
+
+    Si todas las transacciones (de cualquier proceso) bloquean las filas en el
+    mismo orden, no se producen deadlocks entre ellas.
+    """
+    return sorted(rows.items())
+
+
+# --- CORTACIRCUITOS (uno por engine) ---
+primary_breaker = CircuitBreaker("principal", engine)
+replica_breaker = CircuitBreaker("réplica", replica_engine)
+
 Base = declarative_base()
 
-# Función para obtener una sesión de BD en cada request
-def get_db():
-    db = SessionLocal()
+# Cookie y cabecera con las que recordamos que un cliente acaba de escribir.
+# Guardan el instante (epoch) hasta el que sus lecturas deben ir a la
+# principal. La cabecera es para los clientes sin cookies (apps nativas, web en
+# otro origen): la reciben en cada escritura y la reenvían en sus lecturas.
+READ_PRIMARY_COOKIE = "pos_read_primary_until"
+READ_PRIMARY_HEADER = "X-Read-Primary-Until"
+
+_replica_health_lock = threading.Lock()
+_replica_healthy = True
+_replica_checked_at = 0.0
+
+
+def _replica_is_healthy() -> bool:
+    """Comprueba la réplica con un `SELECT 1`, como mucho una vez por intervalo."""
+    global _replica_healthy, _replica_checked_at
+
+    now = time.monotonic()
+    if now - _replica_checked_at < settings.replica_health_check_interval:
+        return _replica_healthy
+
+    # Solo un hilo comprueba; los demás siguen con el último resultado en vez
+    # de esperar a que la réplica conteste.
+    if not _replica_health_lock.acquire(blocking=False):
+        return _replica_healthy
+    try:
+        # Otro hilo pudo haber terminado la comprobación justo antes.
+        if time.monotonic() - _replica_checked_at < settings.replica_health_check_interval:
+            return _replica_healthy
+        try:
+            with replica_engine.connect() as connection:
+                connection.execute(text("SELECT 1"))
+            healthy = True
+        except Exception:
+            healthy = False
+        if healthy != _replica_healthy:
+            estado = "disponible" if healthy else "NO disponible, leyendo de la principal"
+            print(f"--> Réplica de lectura {estado}")
+        _replica_healthy = healthy
+        _replica_checked_at = time.monotonic()
+    finally:
+        _replica_health_lock.release()
+    return _replica_healthy
+
+
+def _client_recently_wrote(request: Request) -> bool:
+    now = time.time()
+    for raw_value in (
+        request.cookies.get(READ_PRIMARY_COOKIE),
+        request.headers.get(READ_PRIMARY_HEADER),
+    ):
+        if raw_value is None:
+            continue
+        try:
+            until = float(raw_value)
+        except ValueError:
+            continue
+        # Más allá de la ventana no lo pudimos emitir nosotros: se ignora.
+        if now < until <= now + settings.read_your_writes_window:
+            return True
+    return False
+
+
+def _request_session(request: Request, session_factory, breaker: CircuitBreaker):
+    """Sesión con el tiempo máximo de consulta de la ruta; informa al cortacircuitos."""
+    route = request.scope.get("route")
+    db = session_factory()
+    set_statement_timeout(db, statement_timeout_for(getattr(route, "path", None)))
     try:
         yield db
+    except DB_FAILURES as exc:
+        if counts_as_failure(exc):
+            breaker.record_failure(exc)
+        raise
+    else:
+        breaker.record_success()
     finally:
         db.close()
+
+
+# Función para obtener una sesión de BD en cada request
+def get_db(request: Request, response: Response):
+    # Si la BD principal está fallando, se responde 503 sin esperar por ella.
+    if settings.db_breaker_enabled:
+        primary_breaker.ensure_allowed()
+
+    # Quien usa esta sesión puede escribir: durante la ventana configurada sus
+    # lecturas se sirven desde la principal (read-your-writes).
+    if replica_engine is not None:
+        window = settings.read_your_writes_window
+        until = str(time.time() + window)
+        response.headers[READ_PRIMARY_HEADER] = until
+        response.set_cookie(
+            READ_PRIMARY_COOKIE,
+            until,
+            max_age=max(int(window), 1),
+            httponly=True,
+            samesite="lax",
+        )
+
+    yield from _request_session(request, SessionLocal, primary_breaker)
+
+
+# Sesión de solo lectura: usa la réplica si existe, está sana (y su circuito
+# cerrado) y el cliente no acaba de escribir; en cualquier otro caso cae a la
+# principal.
+def get_read_db(request: Request):
+    use_replica = (
+        ReplicaSessionLocal is not None
+        and not _client_recently_wrote(request)
+        and (not settings.db_breaker_enabled or replica_breaker.allow())
+        and _replica_is_healthy()
+    )
+    if use_replica:
+        yield from _request_session(request, ReplicaSessionLocal, replica_breaker)
+        return
+
+    if settings.db_breaker_enabled:
+        primary_breaker.ensure_allowed()
+    yield from _request_session(request, SessionLocal, primary_breaker)
@@ -0,0 +1,231 @@
+"""Tiempo máximo por consulta y cortacircuitos de la BD.
+
+Cada sesión de una petición lleva el tiempo máximo de sus consultas según la
+ruta (`statement_timeout_ms`, con excepciones en `statement_timeout_overrides`).
+Al empezar la transacción se copia a la conexión, y antes de cada sentencia:
+
+- MySQL: se añade a los `SELECT` la pista `/*+ MAX_EXECUTION_TIME(ms) */`; el
+  servidor los interrumpe con el error 3024.
+- SQLite: se emula con un manejador de progreso que interrumpe la sentencia
+  cuando vence el plazo.
+
+Las sesiones de los hilos de fondo no llevan límite.
+
+El cortacircuitos (uno por engine) cuenta los errores operativos seguidos
+(tiempos agotados, conexiones caídas, pool sin conexiones libres), uno por
+consulta ejecutada: no cuentan las copias que reciben las lecturas agrupadas
+ni los deadlocks y esperas de bloqueo, que son contención entre peticiones y
+no una BD degradada. Al llegar a
+`db_breaker_failure_threshold` se abre: durante `db_breaker_open_seconds` las
+peticiones que necesitan ese engine se rechazan enseguida con 503. Después, la
+primera petición comprueba la BD con un `SELECT 1` y el circuito se cierra si
+responde o vuelve a abrirse si no.
+"""
+
+import threading
+import time
+
+from fastapi import HTTPException, status
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import DBAPIError, OperationalError, TimeoutError as PoolTimeoutError
+from sqlalchemy.orm import Session
+
+from .config import settings
+from .single_flight import is_shared_error
+
+_TIMEOUT_KEY = "statement_timeout_ms"
+_DEADLINE_KEY = "statement_deadline"
+# Cada cuántas instrucciones de la VM de SQLite se consulta el reloj.
+_SQLITE_PROGRESS_STEPS = 1000
+_MYSQL_TIMEOUT_ERROR = 3024
+# Deadlock y espera de bloqueo agotada (InnoDB).
+_MYSQL_CONTENTION_ERRORS = {1205, 1213}
+
+# Errores que indican que la BD está degradada (no fallos de la petición).
+DB_FAILURES = (OperationalError, PoolTimeoutError)
+
+
+def statement_timeout_for(route_path: str | None) -> int:
+    """Milisegundos máximos por consulta para la ruta (0 = sin límite)."""
+    if route_path is not None and route_path in settings.statement_timeout_overrides:
+        return settings.statement_timeout_overrides[route_path]
+    return settings.statement_timeout_ms
+
+
+def set_statement_timeout(db: Session, timeout_ms: int) -> None:
+    db.info[_TIMEOUT_KEY] = timeout_ms
+
+
+def is_statement_timeout(exc: BaseException) -> bool:
+    if not isinstance(exc, DBAPIError) or exc.orig is None:
+        return False
+    args = getattr(exc.orig, "args", ())
+    if args and args[0] == _MYSQL_TIMEOUT_ERROR:
+        return True
+    return str(exc.orig) == "interrupted"  # SQLite (manejador de progreso).
+
+
+def _is_contention(exc: BaseException) -> bool:
+    if not isinstance(exc, DBAPIError) or exc.orig is None:
+        return False
+    args = getattr(exc.orig, "args", ())
+    if args and args[0] in _MYSQL_CONTENTION_ERRORS:
+        return True
+    return str(exc.orig).startswith("database is locked")  # SQLite.
+
+
+def counts_as_failure(exc: BaseException) -> bool:
+    """True si el error indica que la BD está degradada y debe contarse una vez."""
+    return (
+        isinstance(exc, DB_FAILURES)
+        and not is_shared_error(exc)
+        and not _is_contention(exc)
+    )
+
+
+# --- Aplicación del tiempo máximo en cada sentencia ---
+
+
+@event.listens_for(Session, "after_begin")
+def _copy_timeout_to_connection(session, transaction, connection) -> None:
+    # La info de la conexión sobrevive al pool: se asigna siempre (None = sin límite).
+    connection.info[_TIMEOUT_KEY] = session.info.get(_TIMEOUT_KEY) or None
+
+
+def install_statement_timeouts(engine: Engine) -> None:
+    if engine.dialect.name == "mysql":
+        event.listen(engine, "before_cursor_execute", _add_mysql_hint, retval=True)
+    elif engine.dialect.name == "sqlite":
+        event.listen(engine, "before_cursor_execute", _start_sqlite_deadline)
+        event.listen(engine, "after_cursor_execute", _clear_sqlite_deadline)
+        event.listen(engine, "handle_error", _clear_sqlite_deadline_on_error)
+    event.listen(engine, "checkin", _clear_timeout)
+
+
+def _clear_timeout(dbapi_connection, connection_record) -> None:
+    connection_record.info.pop(_TIMEOUT_KEY, None)
+
+
+def _add_mysql_hint(conn, cursor, statement, parameters, context, executemany):
+    timeout_ms = conn.info.get(_TIMEOUT_KEY)
+    stripped = statement.lstrip()
+    # El servidor solo aplica MAX_EXECUTION_TIME a los SELECT de primer nivel.
+    if timeout_ms and stripped[:6].upper() == "SELECT":
+        statement = f"SELECT /*+ MAX_EXECUTION_TIME({int(timeout_ms)}) */{stripped[6:]}"
+    return statement, parameters
+
+
+def _start_sqlite_deadline(conn, cursor, statement, parameters, context, executemany):
+    timeout_ms = conn.info.get(_TIMEOUT_KEY)
+    if not timeout_ms:
+        return
+    deadline = time.monotonic() + timeout_ms / 1000
+    conn.info[_DEADLINE_KEY] = deadline
+    conn.connection.dbapi_connection.set_progress_handler(
+        lambda: time.monotonic() > deadline, _SQLITE_PROGRESS_STEPS
+    )
+
+
+def _clear_sqlite_deadline(conn, *args) -> None:
+    if conn.info.pop(_DEADLINE_KEY, None) is not None:
+        conn.connection.dbapi_connection.set_progress_handler(None, 0)
+
+
+def _clear_sqlite_deadline_on_error(context) -> None:
+    if context.connection is not None and not context.connection.closed:
+        _clear_sqlite_deadline(context.connection)
+
+
+# --- Cortacircuitos ---
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, engine: Engine | None) -> None:
+        self.name = name
+        self.engine = engine
+        self._lock = threading.Lock()
+        self._probe_lock = threading.Lock()
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._opened_count = 0
+        self._rejected = 0
+        self._timeouts = 0
+
+    def allow(self) -> bool:
+        """True si se puede usar el engine; con el circuito abierto, False."""
+        with self._lock:
+            opened_at = self._opened_at
+        if opened_at is None:
+            return True
+        if time.monotonic() - opened_at < settings.db_breaker_open_seconds:
+            return self._reject()
+        # Plazo cumplido: una sola petición prueba la BD; las demás siguen fuera.
+        if not self._probe_lock.acquire(blocking=False):
+            return self._reject()
+        try:
+            with self.engine.connect() as connection:
+                connection.execute(text("SELECT 1"))
+        except Exception:
+            self._open()
+            return self._reject()
+        finally:
+            self._probe_lock.release()
+        self.record_success()
+        print(f"--> Circuito de la BD ({self.name}) cerrado: la BD responde de nuevo")
+        return True
+
+    def ensure_allowed(self) -> None:
+        if not self.allow():
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="La base de datos no está disponible. Inténtelo de nuevo en unos segundos.",
+                headers={"Retry-After": str(self.retry_after())},
+            )
+
+    def retry_after(self) -> int:
+        with self._lock:
+            opened_at = self._opened_at
+        if opened_at is None:
+            return settings.admission_retry_after
+        remaining = settings.db_breaker_open_seconds - (time.monotonic() - opened_at)
+        return max(int(remaining + 0.999), 1)
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+
+    def record_failure(self, exc: BaseException) -> None:
+        with self._lock:
+            self._failures += 1
+            if is_statement_timeout(exc):
+                self._timeouts += 1
+            should_open = (
+                self._opened_at is None
+                and self._failures >= settings.db_breaker_failure_threshold
+            )
+        if should_open:
+            self._open()
+            cause = getattr(exc, "orig", None) or exc
+            print(f"--> Circuito de la BD ({self.name}) abierto tras varios errores: {cause!r}")
+
+    def _open(self) -> None:
+        with self._lock:
+            self._opened_at = time.monotonic()
+            self._opened_count += 1
+
+    def _reject(self) -> bool:
+        with self._lock:
+            self._rejected += 1
+        return False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "state": "open" if self._opened_at is not None else "closed",
+                "consecutive_failures": self._failures,
+                "times_opened": self._opened_count,
+                "rejected": self._rejected,
+                "statement_timeouts": self._timeouts,
+            }
@@ -18,7 +18,10 @@ def get_current_token(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    token = credentials.credentials
+    return decode_token(credentials.credentials)
+
+
+def decode_token(token: str) -> dict:
     try:
         payload: dict = decode(
             token,
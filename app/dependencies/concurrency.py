@@ -0,0 +1,28 @@
+from fastapi import Header, HTTPException, status
+
+
+def format_etag(version: int) -> str:
+    return f'"{version}"'
+
+
+def get_if_match_version(
+    if_match: str | None = Header(
+        default=None,
+        description="ETag de la versión que se quiere modificar (control de concurrencia optimista)",
+    ),
+) -> int | None:
+    """Devuelve la versión esperada por el cliente, o None si no envió If-Match."""
+    if if_match is None or if_match.strip() == "*":
+        return None
+
+    etag = if_match.strip()
+    if etag.startswith("W/"):
+        etag = etag[2:]
+    try:
+        return int(etag.strip('"'))
+    except ValueError as exc:
+        # Un ETag que no es nuestro nunca puede coincidir con la versión actual.
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail="El ETag enviado en If-Match no es válido.",
+        ) from exc
@@ -0,0 +1,7 @@
+from fastapi import Response
+
+TOTAL_COUNT_HEADER = "X-Total-Count"
+
+
+def set_total_count_headers(response: Response, total: int) -> None:
+    response.headers[TOTAL_COUNT_HEADER] = str(total)
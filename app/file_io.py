@@ -0,0 +1,42 @@
+"""Escritura atómica de archivos y bloqueo entre procesos.
+
+Lo usan los módulos que guardan archivos en disco compartidos por los workers
+(snapshot del catálogo, imágenes, perfiles, diario de stock).
+"""
+
+import os
+import tempfile
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueos, se asume un único worker.
+    fcntl = None
+
+
+def write_atomic(path: str, data: bytes) -> None:
+    """Escribe `path` de una vez: quien lo lea ve el archivo anterior o el nuevo.
+
+    Se escribe (con fsync) un temporal en el mismo directorio y se renombra.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as tmp_file:
+            tmp_file.write(data)
+            tmp_file.flush()
+            os.fsync(tmp_file.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def lock_file(file, blocking: bool = True) -> bool:
+    """Bloqueo exclusivo del archivo abierto hasta cerrarlo (False si está tomado)."""
+    if fcntl is None:
+        return True
+    flags = fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB
+    try:
+        fcntl.flock(file.fileno(), flags)
+    except OSError:
+        return False
+    return True
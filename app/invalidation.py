@@ -0,0 +1,242 @@
+"""Bus de invalidación de cachés entre workers.
+
+Las funciones de escritura de los servicios publican un `ChangeEvent` dentro de
+su transacción. Los suscriptores del propio worker lo reciben en cuanto la
+transacción se confirma. Con el backend "db", el evento también se guarda en la
+tabla `change_log`, y cada worker la consulta con una marca de agua (el último
+`change_id` visto) para avisar a sus suscriptores de los cambios hechos en
+otros procesos.
+"""
+
+import json
+import os
+import socket
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+
+from sqlalchemy import event, func, or_
+from sqlalchemy.orm import Session
+
+from . import models
+from .config import settings
+from .database import SessionLocal
+
+WORKER_ID = f"{socket.gethostname()}-{os.getpid()}"
+
+_PENDING_EVENTS_KEY = "pending_change_events"
+
+# Un hueco en los change_id puede ser una transacción aún sin confirmar: se
+# vuelve a buscar durante este tiempo antes de darlo por perdido.
+_GAP_TIMEOUT_SECONDS = 10.0
+_POLL_BATCH_SIZE = 500
+_PRUNE_INTERVAL_SECONDS = 60.0
+
+
+@dataclass(frozen=True)
+class ChangeEvent:
+    entity: str
+    entity_id: int
+    version: int | None
+    action: str
+    emitted_at: float
+    origin: str
+    # Datos opcionales del cambio (p. ej. stock y precio para los eventos SSE).
+    data: dict | None = None
+
+
+class InvalidationBus:
+    def __init__(self) -> None:
+        self._subscribers: list[Callable[[ChangeEvent], None]] = []
+        self._stats_lock = threading.Lock()
+        self._published = 0
+        self._received_remote = 0
+        self._lag_total = 0.0
+        self._lag_last = 0.0
+        self._lag_max = 0.0
+        self._high_water = 0
+        self._gaps: dict[int, float] = {}
+        self._last_prune = 0.0
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def subscribe(self, callback: Callable[[ChangeEvent], None]) -> None:
+        """Registra una función que se llama con cada cambio (local o remoto)."""
+        self._subscribers.append(callback)
+
+    def publish(
+        self,
+        db: Session,
+        entity: str,
+        entity_id: int,
+        version: int | None,
+        action: str = "update",
+        data: dict | None = None,
+    ) -> None:
+        """Anuncia un cambio; se entrega solo si la transacción de `db` se confirma."""
+        change = ChangeEvent(
+            entity=entity,
+            entity_id=entity_id,
+            version=version,
+            action=action,
+            emitted_at=time.time(),
+            origin=WORKER_ID,
+            data=data,
+        )
+        if settings.invalidation_backend == "db":
+            db.add(
+                models.ChangeLog(
+                    entity=change.entity,
+                    entity_id=change.entity_id,
+                    version=change.version,
+                    action=change.action,
+                    origin=change.origin,
+                    emitted_at=change.emitted_at,
+                    payload=json.dumps(change.data) if change.data is not None else None,
+                )
+            )
+        db.info.setdefault(_PENDING_EVENTS_KEY, []).append(change)
+
+    def _dispatch(self, change: ChangeEvent) -> None:
+        for callback in self._subscribers:
+            try:
+                callback(change)
+            except Exception as exc:
+                print(f"--> Error en un suscriptor de invalidación: {exc}")
+
+    # --- Backend "db": consulta periódica de change_log ---
+
+    def start(self) -> None:
+        if settings.invalidation_backend != "db":
+            return
+        db = SessionLocal()
+        try:
+            # Solo interesan los cambios posteriores al arranque.
+            self._high_water = db.query(func.max(models.ChangeLog.change_id)).scalar() or 0
+        finally:
+            db.close()
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="invalidation-poller", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(settings.invalidation_poll_interval):
+            try:
+                self.poll()
+            except Exception as exc:
+                print(f"--> Error al leer change_log: {exc}")
+
+    def poll(self) -> int:
+        """Entrega los cambios de otros workers. Devuelve cuántos leyó."""
+        now = time.time()
+        self._gaps = {
+            change_id: deadline
+            for change_id, deadline in self._gaps.items()
+            if deadline > now
+        }
+
+        db = SessionLocal()
+        try:
+            criteria = models.ChangeLog.change_id > self._high_water
+            if self._gaps:
+                criteria = or_(criteria, models.ChangeLog.change_id.in_(self._gaps))
+            rows = (
+                db.query(models.ChangeLog)
+                .filter(criteria)
+                .order_by(models.ChangeLog.change_id.asc())
+                .limit(_POLL_BATCH_SIZE)
+                .all()
+            )
+            changes = [
+                (
+                    row.change_id,
+                    ChangeEvent(
+                        entity=row.entity,
+                        entity_id=row.entity_id,
+                        version=row.version,
+                        action=row.action,
+                        emitted_at=row.emitted_at,
+                        origin=row.origin,
+                        data=json.loads(row.payload) if row.payload else None,
+                    ),
+                )
+                for row in rows
+            ]
+            if now - self._last_prune > _PRUNE_INTERVAL_SECONDS:
+                cutoff = now - settings.invalidation_retention_seconds
+                db.query(models.ChangeLog).filter(
+                    models.ChangeLog.emitted_at < cutoff
+                ).delete(synchronize_session=False)
+                db.commit()
+                self._last_prune = now
+        finally:
+            db.close()
+
+        for change_id, change in changes:
+            if change_id in self._gaps:
+                del self._gaps[change_id]
+            elif change_id > self._high_water:
+                for missing in range(self._high_water + 1, change_id):
+                    self._gaps[missing] = now + _GAP_TIMEOUT_SECONDS
+                self._high_water = change_id
+
+            if change.origin == WORKER_ID:
+                continue  # Ya se entregó al confirmar la transacción.
+            self._record_lag(time.time() - change.emitted_at)
+            self._dispatch(change)
+        return len(changes)
+
+    # --- Métricas ---
+
+    def _record_lag(self, lag: float) -> None:
+        with self._stats_lock:
+            self._received_remote += 1
+            self._lag_total += lag
+            self._lag_last = lag
+            self._lag_max = max(self._lag_max, lag)
+
+    def _record_published(self, count: int) -> None:
+        with self._stats_lock:
+            self._published += count
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            received = self._received_remote
+            return {
+                "backend": settings.invalidation_backend,
+                "worker": WORKER_ID,
+                "published": self._published,
+                "received_remote": received,
+                "high_water": self._high_water,
+                "pending_gaps": len(self._gaps),
+                "lag_last_ms": round(self._lag_last * 1000, 2),
+                "lag_avg_ms": round(self._lag_total / received * 1000, 2) if received else 0.0,
+                "lag_max_ms": round(self._lag_max * 1000, 2),
+            }
+
+
+invalidation_bus = InvalidationBus()
+
+
+@event.listens_for(Session, "after_commit")
+def _deliver_pending_events(session: Session) -> None:
+    pending = session.info.pop(_PENDING_EVENTS_KEY, None)
+    if not pending:
+        return
+    invalidation_bus._record_published(len(pending))
+    for change in pending:
+        invalidation_bus._dispatch(change)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending_events(session: Session) -> None:
+    session.info.pop(_PENDING_EVENTS_KEY, None)
@@ -1,17 +1,62 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from app.autocomplete import product_name_index
+from app.catalog_snapshot import catalog_snapshot
+from app.config import settings
 from app.database import engine, Base    # BIEN (sin punto)
+from app.db_guard import DB_FAILURES, is_statement_timeout
+from app.invalidation import invalidation_bus
+from app.middleware.admission import AdmissionMiddleware
 from app.models import product, category
-from app.routers import product_router, category_router
+from app.product_events import product_event_hub
+from app.reservation_sweeper import reservation_sweeper
+from app.routers import (
+    product_router,
+    category_router,
+    image_router,
+    report_router,
+    reservation_router,
+    system_router,
+)
+from app.stock_buffer import stock_buffer
 
 # --- CORREGIR ESTA LÍNEA ---
 # Llama a Base (de database), no a models.Base
 Base.metadata.create_all(bind=engine)
 # --- FIN DE LÍNEA CORREGIDA ---
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    invalidation_bus.start()
+    product_event_hub.start(asyncio.get_running_loop())
+    # Los diarios huérfanos se reproducen aunque el buffer ya no esté activo.
+    stock_buffer.recover()
+    if settings.stock_buffer_enabled:
+        stock_buffer.start()
+    if settings.catalog_snapshot_enabled:
+        catalog_snapshot.start()
+    reservation_sweeper.start()
+    if settings.autocomplete_enabled:
+        product_name_index.start()
+    yield
+    product_name_index.stop()
+    reservation_sweeper.stop()
+    catalog_snapshot.stop()
+    # Al apagar se vuelca todo el stock pendiente antes de cerrar.
+    stock_buffer.stop()
+    product_event_hub.stop()
+    invalidation_bus.stop()
+
+
 app = FastAPI(
     title="API de Productos (Backend 1)",
-    description="Servicio en FastAPI/Python para la gestión de productos en SQL."
+    description="Servicio en FastAPI/Python para la gestión de productos en SQL.",
+    lifespan=lifespan,
 )
 
 # --- Configuración de CORS ---
@@ -21,17 +66,45 @@ origins = [
     # Añade aquí la URL de tu app de Flutter desplegada
 ]
 
+# Control de admisión: se registra antes que CORS para que CORS quede por
+# fuera y también las respuestas 503 lleven sus cabeceras.
+app.add_middleware(AdmissionMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Cabeceras propias que el cliente web necesita leer.
+    expose_headers=["X-Total-Count", "X-Read-Primary-Until"],
 )
 # --- Fin de CORS ---
 
+
+# Errores operativos de la BD (consulta que superó su tiempo máximo, conexión
+# caída, pool agotado): 503 para que el cliente reintente, en vez de un 500.
+async def database_unavailable_handler(request: Request, exc: Exception) -> JSONResponse:
+    if is_statement_timeout(exc):
+        detail = "La consulta tardó demasiado. Inténtelo de nuevo en unos segundos."
+    else:
+        detail = "La base de datos no está disponible. Inténtelo de nuevo en unos segundos."
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": detail},
+        headers={"Retry-After": str(settings.admission_retry_after)},
+    )
+
+
+for db_failure in DB_FAILURES:
+    app.add_exception_handler(db_failure, database_unavailable_handler)
+
 app.include_router(product_router.router)
 app.include_router(category_router.router) # Asegúrate de haber creado este router
+app.include_router(image_router.router)
+app.include_router(report_router.router)
+app.include_router(reservation_router.router)
+app.include_router(system_router.router)
 
 @app.get("/")
 def read_root():
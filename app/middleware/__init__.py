@@ -0,0 +1,2 @@
+"""Middlewares ASGI de la aplicación."""
+
@@ -0,0 +1,143 @@
+"""Control de admisión y descarte de carga delante del pool de la BD.
+
+Cada clase de ruta (lecturas y escrituras) tiene un límite de peticiones en
+curso y una cola corta de espera. Si la cola está llena, o si la espera supera
+`admission_queue_timeout`, se responde enseguida 503 con `Retry-After` en lugar
+de dejar que la petición ocupe un hilo esperando una conexión.
+"""
+
+import asyncio
+from collections import deque
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from ..config import settings
+
+_READ_METHODS = {"GET", "HEAD"}
+
+
+class RouteClassLimiter:
+    def __init__(self, name: str, limit: int, queue_size: int) -> None:
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.in_flight = 0
+        self.max_waiting = 0
+        self.admitted = 0
+        self.shed_queue_full = 0
+        self.shed_timeout = 0
+        self._waiters: deque[asyncio.Future] = deque()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self) -> bool:
+        """Intenta obtener turno; False si la petición debe descartarse."""
+        if self.in_flight < self.limit and not self._waiters:
+            self.in_flight += 1
+            self.admitted += 1
+            return True
+        if len(self._waiters) >= self.queue_size:
+            self.shed_queue_full += 1
+            return False
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.max_waiting = max(self.max_waiting, len(self._waiters))
+        try:
+            # `release` cede su turno directamente a la primera petición en cola.
+            await asyncio.wait_for(waiter, settings.admission_queue_timeout)
+        except asyncio.TimeoutError:
+            self.shed_timeout += 1
+            return False
+        except asyncio.CancelledError:
+            # El cliente se fue justo cuando se le cedía el turno: se devuelve.
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+        self.admitted += 1
+        return True
+
+    def release(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "queue_size": self.queue_size,
+            "in_flight": self.in_flight,
+            "queue_depth": self.waiting,
+            "max_queue_depth": self.max_waiting,
+            "admitted": self.admitted,
+            "shed_queue_full": self.shed_queue_full,
+            "shed_timeout": self.shed_timeout,
+        }
+
+
+class AdmissionController:
+    def __init__(self) -> None:
+        self.read = RouteClassLimiter(
+            "read", settings.admission_read_limit, settings.admission_read_queue
+        )
+        self.write = RouteClassLimiter(
+            "write", settings.admission_write_limit, settings.admission_write_queue
+        )
+
+    def limiter_for(self, method: str, path: str) -> RouteClassLimiter | None:
+        if not settings.admission_enabled or method == "OPTIONS":
+            return None
+        if any(path.startswith(prefix) for prefix in settings.admission_exempt_paths):
+            return None
+        if not any(path.startswith(prefix) for prefix in settings.admission_paths):
+            return None
+        return self.read if method in _READ_METHODS else self.write
+
+    def stats(self) -> dict:
+        return {
+            "enabled": settings.admission_enabled,
+            "read": self.read.stats(),
+            "write": self.write.stats(),
+        }
+
+
+admission_controller = AdmissionController()
+
+
+class AdmissionMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        limiter = admission_controller.limiter_for(scope["method"], scope["path"])
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+
+        if not await limiter.acquire():
+            response = JSONResponse(
+                status_code=503,
+                content={"detail": "Servicio saturado, inténtelo de nuevo en unos segundos."},
+                headers={"Retry-After": str(settings.admission_retry_after)},
+            )
+            await response(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release()
@@ -2,4 +2,9 @@
 # cuando se importe la carpeta 'models'
 
 from .product import Product
-from .category import Category
\ No newline at end of file
+from .category import Category
+from .stock_journal import StockJournalCheckpoint
+from .change_log import ChangeLog
+from .product_tombstone import ProductTombstone
+from .inventory_summary import InventorySummary
+from .stock_reservation import StockReservation
@@ -1,8 +1,10 @@
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, Integer, String, text
 from ..database import Base
 
 class Category(Base):
     __tablename__ = "categories"
 
     category_id = Column(Integer, primary_key=True, autoincrement=True)
-    name = Column(String(100), nullable=False)
\ No newline at end of file
+    name = Column(String(100), nullable=False)
+    # Versión para control de concurrencia optimista (se expone como ETag).
+    version = Column(Integer, nullable=False, server_default=text("1"), default=1)
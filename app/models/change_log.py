@@ -0,0 +1,24 @@
+from sqlalchemy import BigInteger, Column, Float, Integer, String, Text
+
+from ..database import Base
+
+
+class ChangeLog(Base):
+    """Registro de cambios que leen los demás workers para invalidar cachés."""
+
+    __tablename__ = "change_log"
+
+    change_id = Column(
+        BigInteger().with_variant(Integer, "sqlite"),
+        primary_key=True,
+        autoincrement=True,
+    )
+    entity = Column(String(50), nullable=False)
+    entity_id = Column(Integer, nullable=False)
+    version = Column(Integer, nullable=True)
+    action = Column(String(10), nullable=False)
+    origin = Column(String(100), nullable=False)
+    # Epoch en segundos del worker que publicó el cambio (para medir el retraso).
+    emitted_at = Column(Float(precision=53), nullable=False)
+    # Datos del cambio en JSON (opcional).
+    payload = Column(Text, nullable=True)
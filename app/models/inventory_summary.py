@@ -0,0 +1,24 @@
+from sqlalchemy import DECIMAL, Column, ForeignKey, Integer, text
+
+from ..database import Base
+
+
+class InventorySummary(Base):
+    """Valorización del inventario por categoría, mantenida por deltas.
+
+    Cada escritura de productos ajusta su fila en la misma transacción; solo
+    cuentan en `units` y `stock_value` los productos activos.
+    """
+
+    __tablename__ = "inventory_summary"
+
+    category_id = Column(
+        Integer,
+        ForeignKey("categories.category_id", ondelete="CASCADE"),
+        primary_key=True,
+        autoincrement=False,
+    )
+    product_count = Column(Integer, nullable=False, server_default=text("0"), default=0)
+    active_count = Column(Integer, nullable=False, server_default=text("0"), default=0)
+    units = Column(Integer, nullable=False, server_default=text("0"), default=0)
+    stock_value = Column(DECIMAL(16, 2), nullable=False, server_default=text("0"), default=0)
@@ -5,6 +5,7 @@ from sqlalchemy import (
     Column,
     DECIMAL,
     ForeignKey,
+    Index,
     Integer,
     String,
     Text,
@@ -21,6 +22,8 @@ class Product(Base):
     __table_args__ = (
         CheckConstraint("price >= 0", name="ck_products_price_positive"),
         CheckConstraint("stock >= 0", name="ck_products_stock_non_negative"),
+        # Cursor de la sincronización incremental (GET /products/changes).
+        Index("ix_products_updated_at_product_id", "updated_at", "product_id"),
     )
 
     product_id = Column(Integer, primary_key=True, autoincrement=True)
@@ -38,5 +41,19 @@ class Product(Base):
     )
     active = Column(BOOLEAN, nullable=False, server_default=text("1"), default=True)
     category_id = Column(Integer, ForeignKey("categories.category_id"), nullable=False)
+    # Versión para control de concurrencia optimista (se expone como ETag).
+    version = Column(Integer, nullable=False, server_default=text("1"), default=1)
 
     category = relationship("Category")
+
+    def event_payload(self) -> dict:
+        """Campos que viajan en los eventos de cambio (bus y SSE)."""
+        return {
+            "product_id": self.product_id,
+            "version": self.version,
+            "name": self.name,
+            "price": str(self.price),
+            "stock": self.stock,
+            "active": bool(self.active),
+            "category_id": self.category_id,
+        }
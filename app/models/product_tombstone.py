@@ -0,0 +1,16 @@
+from sqlalchemy import TIMESTAMP, Column, Index, Integer
+from sqlalchemy.sql import func
+
+from ..database import Base
+
+
+class ProductTombstone(Base):
+    """Marca de un producto eliminado físicamente, para la sincronización incremental."""
+
+    __tablename__ = "product_tombstones"
+    __table_args__ = (
+        Index("ix_product_tombstones_deleted_at_product_id", "deleted_at", "product_id"),
+    )
+
+    product_id = Column(Integer, primary_key=True, autoincrement=False)
+    deleted_at = Column(TIMESTAMP, server_default=func.now(), nullable=False)
@@ -0,0 +1,16 @@
+from sqlalchemy import BigInteger, Column, String
+
+from ..database import Base
+
+
+class StockJournalCheckpoint(Base):
+    """Última entrada de cada diario de stock ya aplicada a `products`.
+
+    Se actualiza en la misma transacción que los incrementos de stock, de modo
+    que al reproducir un diario tras una caída no se aplique nada dos veces.
+    """
+
+    __tablename__ = "stock_journal_checkpoints"
+
+    journal = Column(String(255), primary_key=True)
+    last_seq = Column(BigInteger, nullable=False, default=0)
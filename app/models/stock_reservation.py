@@ -0,0 +1,44 @@
+from sqlalchemy import (
+    TIMESTAMP,
+    CheckConstraint,
+    Column,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+)
+from sqlalchemy.sql import func
+
+from ..database import Base
+
+
+class StockReservation(Base):
+    """Unidades apartadas de un producto durante un checkout.
+
+    El stock se descuenta al reservar; si la reserva se libera o caduca sin
+    confirmarse, las unidades se devuelven al producto.
+    """
+
+    __tablename__ = "stock_reservations"
+    __table_args__ = (
+        CheckConstraint("quantity > 0", name="ck_stock_reservations_quantity_positive"),
+        # Búsqueda de reservas caducadas por el barrido periódico.
+        Index("ix_stock_reservations_status_expires_at", "status", "expires_at"),
+    )
+
+    reservation_id = Column(Integer, primary_key=True, autoincrement=True)
+    product_id = Column(
+        Integer,
+        ForeignKey("products.product_id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+    quantity = Column(Integer, nullable=False)
+    # held -> committed | released | expired
+    status = Column(String(10), nullable=False, default="held")
+    created_at = Column(TIMESTAMP, server_default=func.now(), nullable=False)
+    # Epoch en segundos en el que la reserva deja de ser válida.
+    expires_at = Column(Float(precision=53), nullable=False)
+    # Epoch del último cambio de estado (para purgar las reservas cerradas).
+    closed_at = Column(Float(precision=53), nullable=True)
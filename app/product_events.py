@@ -0,0 +1,136 @@
+"""Difusión de cambios de productos a clientes SSE.
+
+Un único `ProductEventHub` por worker se suscribe al bus de invalidación y
+reparte cada cambio de producto entre las conexiones abiertas. Cada conexión
+tiene un buffer acotado: si el cliente no lee a tiempo se descartan los eventos
+más antiguos y se le envía un `reset` para que vuelva a consultar el estado.
+"""
+
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from dataclasses import dataclass
+
+from .config import settings
+from .invalidation import ChangeEvent, invalidation_bus
+
+
+@dataclass(frozen=True)
+class ProductMessage:
+    event_id: str
+    seq: int
+    product_id: int
+    category_id: int | None
+    data: dict
+
+    def encode(self) -> str:
+        return f"id: {self.event_id}\nevent: product\ndata: {json.dumps(self.data)}\n\n"
+
+
+RESET_MESSAGE = "event: reset\ndata: {}\n\n"
+
+
+class ProductSubscriber:
+    def __init__(self, category_id: int | None, product_ids: set[int] | None) -> None:
+        self.category_id = category_id
+        self.product_ids = product_ids
+        self.queue: deque[ProductMessage] = deque(maxlen=settings.sse_subscriber_buffer)
+        self.dropped = False
+        self._ready = asyncio.Event()
+
+    def matches(self, message: ProductMessage) -> bool:
+        if self.product_ids is not None and message.product_id not in self.product_ids:
+            return False
+        if self.category_id is not None and message.category_id != self.category_id:
+            return False
+        return True
+
+    def offer(self, message: ProductMessage) -> None:
+        if not self.matches(message):
+            return
+        if len(self.queue) == self.queue.maxlen:
+            self.dropped = True  # deque(maxlen) descarta el más antiguo.
+        self.queue.append(message)
+        self._ready.set()
+
+    async def wait(self, timeout: float) -> bool:
+        """Espera a que haya mensajes; False si venció el tiempo."""
+        if self.queue:
+            return True
+        self._ready.clear()
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+
+class ProductEventHub:
+    def __init__(self) -> None:
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._subscribers: set[ProductSubscriber] = set()
+        self._history: deque[ProductMessage] = deque(maxlen=settings.sse_history_size)
+        self._seq = 0
+        # Los IDs de evento solo tienen sentido dentro de este worker.
+        self._epoch = f"{os.getpid():x}{int(time.time()):x}"
+        invalidation_bus.subscribe(self._on_change)
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
+
+    def stop(self) -> None:
+        self._loop = None
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def _on_change(self, change: ChangeEvent) -> None:
+        # Llega desde el hilo que confirmó la transacción o desde el lector de
+        # change_log; el reparto se hace siempre en el event loop.
+        loop = self._loop
+        if change.entity != "product" or change.data is None or loop is None:
+            return
+        loop.call_soon_threadsafe(self._fan_out, change)
+
+    def _fan_out(self, change: ChangeEvent) -> None:
+        self._seq += 1
+        message = ProductMessage(
+            event_id=f"{self._epoch}-{self._seq}",
+            seq=self._seq,
+            product_id=change.entity_id,
+            category_id=change.data.get("category_id"),
+            data={**change.data, "action": change.action},
+        )
+        self._history.append(message)
+        for subscriber in self._subscribers:
+            subscriber.offer(message)
+
+    def subscribe(
+        self,
+        category_id: int | None = None,
+        product_ids: set[int] | None = None,
+        last_event_id: str | None = None,
+    ) -> ProductSubscriber:
+        """Registra una conexión y, si es posible, reanuda desde `last_event_id`."""
+        subscriber = ProductSubscriber(category_id, product_ids)
+        if last_event_id:
+            epoch, _, seq = last_event_id.rpartition("-")
+            oldest = self._history[0].seq if self._history else self._seq + 1
+            if epoch != self._epoch or not seq.isdigit() or int(seq) + 1 < oldest:
+                # Otro worker o historial insuficiente: el cliente debe releer.
+                subscriber.dropped = True
+            else:
+                for message in self._history:
+                    if message.seq > int(seq):
+                        subscriber.offer(message)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: ProductSubscriber) -> None:
+        self._subscribers.discard(subscriber)
+
+
+product_event_hub = ProductEventHub()
@@ -0,0 +1,207 @@
+"""Perfilado bajo demanda de peticiones concretas.
+
+Con `profiling_enabled`, una petición se perfila si trae la cabecera
+`X-Profile: 1` junto con un token válido, o si le toca por muestreo (una de
+cada `profiling_sample_rate`). Se perfila con cProfile tanto el hilo del event
+loop (resolución de la petición y serialización de la respuesta) como el hilo
+del threadpool donde corre un endpoint síncrono.
+
+Cada perfil se guarda en `profiling_dir` como un archivo `.prof` (pstats) cuyo
+nombre lleva la ruta y la latencia; solo se conservan los
+`profiling_max_files` más recientes.
+"""
+
+import contextvars
+import cProfile
+import functools
+import inspect
+import itertools
+import marshal
+import os
+import pstats
+import re
+import threading
+import time
+from collections.abc import Callable
+from datetime import datetime, timezone
+
+from fastapi import HTTPException, Request, Response, status
+from fastapi.routing import APIRoute
+from starlette.concurrency import run_in_threadpool
+
+from .config import settings
+from .dependencies.auth import decode_token
+from .file_io import write_atomic
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+
+_PROFILE_NAME_PATTERN = re.compile(
+    r"^(?P<epoch_ms>\d+)_(?P<method>[A-Z]+)_(?P<latency_ms>\d+)ms_(?P<route>[\w-]+)\.prof$"
+)
+
+_current_profile: contextvars.ContextVar["_RequestProfile | None"] = (
+    contextvars.ContextVar("current_profile", default=None)
+)
+# cProfile no admite perfiles simultáneos en todas las versiones de Python
+# (desde 3.12 es global al intérprete): uno por worker a la vez.
+_profiling_lock = threading.Lock()
+_request_counter = itertools.count(1)
+
+
+class _RequestProfile:
+    def __init__(self) -> None:
+        self.profilers: list[cProfile.Profile] = []
+
+    def start(self) -> cProfile.Profile | None:
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Python >= 3.12: el perfil del event loop ya ve todos los hilos.
+            return None
+        self.profilers.append(profiler)
+        return profiler
+
+
+def _should_profile(request: Request) -> bool:
+    if not settings.profiling_enabled:
+        return False
+    if request.headers.get(PROFILE_HEADER) == "1":
+        scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+        if scheme.lower() == "bearer" and token:
+            try:
+                decode_token(token)
+                return True
+            except HTTPException:
+                pass
+    rate = settings.profiling_sample_rate
+    return rate > 0 and next(_request_counter) % rate == 0
+
+
+def _route_slug(path: str) -> str:
+    return re.sub(r"[^A-Za-z0-9]+", "-", path).strip("-") or "root"
+
+
+def _write_profile(profile: _RequestProfile, method: str, path: str, latency: float) -> str:
+    directory = settings.profiling_dir
+    os.makedirs(directory, exist_ok=True)
+    epoch_ms = int(time.time() * 1000)
+    name = f"{epoch_ms}_{method}_{int(latency * 1000)}ms_{_route_slug(path)}.prof"
+
+    stats = pstats.Stats(profile.profilers[0])
+    for profiler in profile.profilers[1:]:
+        stats.add(profiler)
+    # Mismo contenido que `stats.dump_stats`, escrito de forma atómica.
+    write_atomic(os.path.join(directory, name), marshal.dumps(stats.stats))
+
+    _trim_ring(directory)
+    return name
+
+
+def _trim_ring(directory: str) -> None:
+    names = sorted(
+        name for name in os.listdir(directory) if _PROFILE_NAME_PATTERN.match(name)
+    )
+    for name in names[: max(len(names) - settings.profiling_max_files, 0)]:
+        try:
+            os.remove(os.path.join(directory, name))
+        except FileNotFoundError:
+            pass  # Otro worker ya lo borró.
+
+
+def _profile_sync_endpoint(endpoint: Callable) -> Callable:
+    """Perfila también el hilo del threadpool donde corre el endpoint."""
+
+    @functools.wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        profile = _current_profile.get()
+        profiler = profile.start() if profile is not None else None
+        try:
+            return endpoint(*args, **kwargs)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+
+    return wrapper
+
+
+class ProfilingRoute(APIRoute):
+    """`APIRoute` que perfila la petición cuando corresponde (ver el módulo)."""
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs) -> None:
+        if not inspect.iscoroutinefunction(endpoint):
+            endpoint = _profile_sync_endpoint(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def profiled_handler(request: Request) -> Response:
+            if not _should_profile(request) or not _profiling_lock.acquire(blocking=False):
+                return await handler(request)
+
+            profile = _RequestProfile()
+            token = _current_profile.set(profile)
+            started = time.perf_counter()
+            profiler = profile.start()
+            try:
+                response = await handler(request)
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+                _current_profile.reset(token)
+                _profiling_lock.release()
+            latency = time.perf_counter() - started
+
+            if profile.profilers:
+                try:
+                    name = await run_in_threadpool(
+                        _write_profile, profile, request.method, self.path, latency
+                    )
+                    response.headers[PROFILE_ID_HEADER] = name
+                except OSError as exc:
+                    print(f"--> No se pudo guardar el perfil de {self.path}: {exc}")
+            return response
+
+        return profiled_handler
+
+
+def list_profiles() -> list[dict]:
+    """Perfiles guardados, del más reciente al más antiguo."""
+    directory = settings.profiling_dir
+    if not os.path.isdir(directory):
+        return []
+    profiles = []
+    for name in sorted(os.listdir(directory), reverse=True):
+        match = _PROFILE_NAME_PATTERN.match(name)
+        if match is None:
+            continue
+        try:
+            size = os.path.getsize(os.path.join(directory, name))
+        except FileNotFoundError:
+            continue
+        profiles.append(
+            {
+                "name": name,
+                "method": match["method"],
+                "route": match["route"],
+                "latency_ms": int(match["latency_ms"]),
+                "created_at": datetime.fromtimestamp(
+                    int(match["epoch_ms"]) / 1000, tz=timezone.utc
+                ),
+                "size": size,
+            }
+        )
+    return profiles
+
+
+def get_profile_path(name: str) -> str:
+    if _PROFILE_NAME_PATTERN.match(name):
+        path = os.path.join(settings.profiling_dir, name)
+        if os.path.isfile(path):
+            return path
+    raise HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail="Perfil no encontrado.",
+    )
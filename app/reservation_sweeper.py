@@ -0,0 +1,85 @@
+"""Barrido periódico de reservas de stock caducadas.
+
+Cada `reservation_sweep_interval` segundos se caducan, por lotes de
+`reservation_sweep_batch_size`, las reservas retenidas cuyo plazo venció y se
+devuelven sus unidades a los productos. Cada lote es una transacción corta, así
+que el barrido nunca retiene muchas filas a la vez. De paso se purgan las
+reservas cerradas hace más de `reservation_retention_seconds`.
+"""
+
+import threading
+import time
+
+from .config import settings
+from .database import SessionLocal
+from .services import reservation_service
+
+
+class ReservationSweeper:
+    def __init__(self) -> None:
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._stats_lock = threading.Lock()
+        self._expired = 0
+        self._purged = 0
+        self._last_sweep_ms = 0.0
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="reservation-sweeper", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(settings.reservation_sweep_interval):
+            try:
+                self.sweep()
+            except Exception as exc:
+                print(f"--> Error al caducar reservas de stock: {exc}")
+
+    def sweep(self) -> int:
+        """Caduca todas las reservas vencidas, lote a lote. Devuelve cuántas."""
+        started = time.perf_counter()
+        batch_size = settings.reservation_sweep_batch_size
+        expired = purged = 0
+        while not self._stop.is_set():
+            db = SessionLocal()
+            try:
+                count = reservation_service.expire_reservations(db, batch_size)
+            finally:
+                db.close()
+            expired += count
+            if count < batch_size:
+                break
+
+        db = SessionLocal()
+        try:
+            purged = reservation_service.purge_closed_reservations(
+                db, time.time() - settings.reservation_retention_seconds, batch_size
+            )
+        finally:
+            db.close()
+
+        with self._stats_lock:
+            self._expired += expired
+            self._purged += purged
+            self._last_sweep_ms = (time.perf_counter() - started) * 1000
+        return expired
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "expired": self._expired,
+                "purged": self._purged,
+                "last_sweep_ms": round(self._last_sweep_ms, 2),
+            }
+
+
+reservation_sweeper = ReservationSweeper()
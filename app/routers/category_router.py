@@ -1,14 +1,17 @@
 from typing import List
 
-from fastapi import APIRouter, Depends, Path, Query, status
+from fastapi import APIRouter, Depends, Path, Query, Response, status
 from sqlalchemy.orm import Session
 
-from ..database import get_db
+from ..database import get_db, get_read_db
 from ..dependencies.auth import get_current_token
+from ..dependencies.concurrency import format_etag, get_if_match_version
+from ..dependencies.pagination import set_total_count_headers
+from ..profiling import ProfilingRoute
 from ..schemas import category as category_schema
-from ..services import category_service
+from ..services import category_service, count_service
 
-router = APIRouter(prefix="/categories", tags=["Categories"])
+router = APIRouter(prefix="/categories", tags=["Categories"], route_class=ProfilingRoute)
 
 
 @router.post(
@@ -31,15 +34,28 @@ def create_category(
     "/",
     response_model=List[category_schema.Category],
     summary="Obtener todas las categorías",
-    description="Obtiene una lista de categorías con paginación, ordenadas por nombre.",
+    description=(
+        "Obtiene una lista de categorías con paginación, ordenadas por nombre. Con "
+        "`include_total=true` la cabecera `X-Total-Count` trae el total exacto de categorías."
+    ),
 )
 def read_categories(
+    response: Response,
     skip: int = Query(0, ge=0, description="Número de registros a omitir"),
     limit: int = Query(100, gt=0, le=200, description="Número máximo de registros a retornar"),
-    db: Session = Depends(get_db),
+    include_total: bool = Query(
+        False, description="Devolver el total en la cabecera X-Total-Count"
+    ),
+    db: Session = Depends(get_read_db),
 ) -> List[category_schema.Category]:
     """Obtiene todas las categorías"""
-    return category_service.get_categories(db=db, skip=skip, limit=limit)
+    categories = category_service.get_categories(db=db, skip=skip, limit=limit)
+    if include_total:
+        set_total_count_headers(
+            response,
+            count_service.category_total(db, skip, limit, len(categories)),
+        )
+    return categories
 
 
 @router.get(
@@ -49,11 +65,14 @@ def read_categories(
     description="Obtiene los detalles de una categoría específica por su ID.",
 )
 def read_category(
+    response: Response,
     category_id: int = Path(..., gt=0, description="ID de la categoría"),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ) -> category_schema.Category:
     """Obtiene una categoría por su ID"""
-    return category_service.get_category(db=db, category_id=category_id)
+    category = category_service.get_category(db=db, category_id=category_id)
+    response.headers["ETag"] = format_etag(category.version)
+    return category
 
 
 @router.put(
@@ -61,19 +80,24 @@ def read_category(
     response_model=category_schema.Category,
     dependencies=[Depends(get_current_token)],
     summary="Actualizar completamente una categoría (PUT)",
-    description="Actualiza todos los campos de una categoría. Requiere autenticación.",
+    description="Actualiza todos los campos de una categoría. Requiere autenticación. Admite If-Match con el ETag para evitar sobrescribir cambios ajenos (412 si no coincide).",
 )
 def put_category(
     category_id: int,
     category: category_schema.CategoryCreate,
+    response: Response,
+    expected_version: int | None = Depends(get_if_match_version),
     db: Session = Depends(get_db),
 ) -> category_schema.Category:
     """Actualiza completamente una categoría (PUT)"""
-    return category_service.put_category(
+    updated = category_service.put_category(
         db=db,
         category_id=category_id,
         category_in=category,
+        expected_version=expected_version,
     )
+    response.headers["ETag"] = format_etag(updated.version)
+    return updated
 
 
 @router.patch(
@@ -81,19 +105,24 @@ def put_category(
     response_model=category_schema.Category,
     dependencies=[Depends(get_current_token)],
     summary="Actualizar parcialmente una categoría (PATCH)",
-    description="Actualiza solo los campos proporcionados de una categoría. Requiere autenticación.",
+    description="Actualiza solo los campos proporcionados de una categoría. Requiere autenticación. Admite If-Match con el ETag (412 si no coincide).",
 )
 def update_category(
     category_id: int,
     category: category_schema.CategoryUpdate,
+    response: Response,
+    expected_version: int | None = Depends(get_if_match_version),
     db: Session = Depends(get_db),
 ) -> category_schema.Category:
     """Actualiza parcialmente una categoría (PATCH)"""
-    return category_service.update_category(
+    updated = category_service.update_category(
         db=db,
         category_id=category_id,
         category_update=category,
+        expected_version=expected_version,
     )
+    response.headers["ETag"] = format_etag(updated.version)
+    return updated
 
 
 @router.delete(
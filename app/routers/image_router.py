@@ -0,0 +1,35 @@
+from fastapi import APIRouter, Header, Path, Response
+from fastapi.responses import FileResponse
+
+from ..services import image_service
+
+router = APIRouter(prefix="/images", tags=["Images"])
+
+# El contenido de una URL nunca cambia (va en el hash), así que se puede
+# cachear sin límite en el cliente y en cualquier proxy intermedio.
+_IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+@router.get(
+    "/{digest}/{filename}",
+    response_class=FileResponse,
+    summary="Obtener una imagen o una de sus miniaturas",
+    description=(
+        "Sirve una imagen almacenada localmente (`original.<ext>` o `<tamaño>.jpg`). "
+        "Las respuestas son inmutables, incluyen ETag y admiten peticiones Range."
+    ),
+)
+async def read_image(
+    digest: str = Path(..., description="Hash SHA-256 del contenido original"),
+    filename: str = Path(..., description="Variante: original.<ext> o <tamaño>.jpg"),
+    if_none_match: str | None = Header(None),
+) -> Response:
+    """Sirve una imagen almacenada localmente"""
+    path = image_service.get_image_path(digest, filename)
+    headers = {
+        "Cache-Control": _IMMUTABLE_CACHE_CONTROL,
+        "ETag": f'"{digest}-{filename}"',
+    }
+    if if_none_match is not None and headers["ETag"] in if_none_match:
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, headers=headers)
@@ -1,14 +1,36 @@
-from typing import List
+import time
+from typing import List, Literal, Union
 
-from fastapi import APIRouter, Depends, Path, Query, status
+from fastapi import (
+    APIRouter,
+    Depends,
+    File,
+    Header,
+    HTTPException,
+    Path,
+    Query,
+    Request,
+    Response,
+    UploadFile,
+    status,
+)
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
-from ..database import get_db
+from ..database import get_db, get_read_db
 from ..dependencies.auth import get_current_token
+from ..autocomplete import product_name_index
+from ..catalog_snapshot import catalog_snapshot
+from ..config import settings
+from ..dependencies.concurrency import format_etag, get_if_match_version
+from ..dependencies.pagination import set_total_count_headers
+from ..product_events import RESET_MESSAGE, product_event_hub
+from ..profiling import ProfilingRoute
+from ..schemas import facets as facets_schema
 from ..schemas import product as product_schema
-from ..services import product_service
+from ..services import count_service, facet_service, product_service
 
-router = APIRouter(prefix="/products", tags=["Products"])
+router = APIRouter(prefix="/products", tags=["Products"], route_class=ProfilingRoute)
 
 
 @router.post(
@@ -29,39 +51,283 @@ def create_product(
 
 @router.get(
     "/",
-    response_model=List[product_schema.Product],
+    response_model=List[Union[product_schema.ProductExpanded, product_schema.Product]],
     summary="Obtener todos los productos",
-    description="Obtiene una lista de productos con paginación. Por defecto solo muestra productos activos.",
+    description=(
+        "Obtiene una lista de productos con paginación. Por defecto solo muestra productos "
+        "activos. Con `expand=category` cada producto incluye su categoría. Con "
+        "`include_total=true` la cabecera `X-Total-Count` trae el total exacto de productos."
+    ),
 )
 def read_products(
+    response: Response,
     skip: int = Query(0, ge=0, description="Número de registros a omitir"),
     limit: int = Query(100, gt=0, le=200, description="Número máximo de registros a retornar"),
     include_inactive: bool = Query(
         False, description="Incluir productos inactivos en los resultados"
     ),
-    db: Session = Depends(get_db),
+    expand: Literal["category"] | None = Query(
+        None, description="`category` para incluir la categoría de cada producto"
+    ),
+    include_total: bool = Query(
+        False, description="Devolver el total en la cabecera X-Total-Count"
+    ),
+    db: Session = Depends(get_read_db),
 ) -> List[product_schema.Product]:
     """Obtiene todos los productos"""
-    return product_service.get_products(
+    products = product_service.get_products(
         db=db,
         skip=skip,
         limit=limit,
         include_inactive=include_inactive,
+        expand_category=expand == "category",
     )
+    if include_total:
+        set_total_count_headers(
+            response,
+            count_service.product_total(
+                db, skip, limit, len(products), include_inactive
+            ),
+        )
+    return products
+
+
+@router.get(
+    "/changes",
+    response_model=product_schema.ProductChanges,
+    summary="Obtener los cambios de productos desde un token",
+    description=(
+        "Sincronización incremental para clientes offline. Devuelve los productos creados o "
+        "modificados (activos e inactivos) y los IDs de los eliminados desde el token `since`, "
+        "junto con el token para la siguiente llamada. Sin `since` devuelve el catálogo completo "
+        "por páginas. Mientras `has_more` sea verdadero, hay que seguir llamando con `next_token`."
+    ),
+)
+def read_product_changes(
+    since: str | None = Query(
+        None, description="Token devuelto por la llamada anterior (next_token)"
+    ),
+    limit: int = Query(500, gt=0, le=1000, description="Número máximo de cambios a retornar"),
+    db: Session = Depends(get_read_db),
+) -> product_schema.ProductChanges:
+    """Obtiene los cambios de productos desde un token"""
+    return product_service.get_product_changes(db=db, since=since, limit=limit)
+
+
+@router.get(
+    "/events",
+    response_class=StreamingResponse,
+    summary="Recibir cambios de productos en tiempo real (SSE)",
+    description=(
+        "Flujo Server-Sent Events con los cambios de productos (stock, precio, estado activo). "
+        "Se puede filtrar por categoría o por IDs de producto. Al reconectar, el navegador envía "
+        "Last-Event-ID y se reenvían los eventos perdidos si este worker aún los conserva; si no, "
+        "se emite un evento `reset` para que el cliente vuelva a consultar los productos."
+    ),
+)
+async def stream_product_events(
+    request: Request,
+    category_id: int | None = Query(None, gt=0, description="Solo productos de esta categoría"),
+    product_id: List[int] | None = Query(None, description="Solo estos productos (se puede repetir)"),
+    last_event_id: str | None = Header(None, description="Último evento recibido"),
+) -> StreamingResponse:
+    """Envía por SSE los cambios de productos"""
+    subscriber = product_event_hub.subscribe(
+        category_id=category_id,
+        product_ids=set(product_id) if product_id else None,
+        last_event_id=last_event_id,
+    )
+
+    async def event_stream():
+        # Cada flujo se cierra tras `sse_max_stream_seconds`: el navegador
+        # reconecta solo (con Last-Event-ID) y así un apagado o reinicio del
+        # worker no queda esperando a conexiones que nunca terminan.
+        deadline = time.monotonic() + settings.sse_max_stream_seconds
+        try:
+            yield "retry: 3000\n\n"
+            while time.monotonic() < deadline and not await request.is_disconnected():
+                if subscriber.dropped:
+                    subscriber.dropped = False
+                    yield RESET_MESSAGE
+                if not await subscriber.wait(settings.sse_keepalive_seconds):
+                    yield ": keepalive\n\n"
+                    continue
+                while subscriber.queue:
+                    yield subscriber.queue.popleft().encode()
+        finally:
+            product_event_hub.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _parse_range(range_header: str, size: int) -> tuple[int, int] | None:
+    """Interpreta `Range: bytes=a-b` (un solo rango). Devuelve (inicio, fin inclusivo).
+
+    None si el rango no es válido o no se puede satisfacer.
+    """
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    start_text, _, end_text = spec.strip().partition("-")
+    try:
+        if not start_text:
+            suffix = int(end_text)
+            if suffix <= 0:
+                return None
+            return max(size - suffix, 0), size - 1
+        start = int(start_text)
+        end = int(end_text) if end_text else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+@router.get(
+    "/snapshot",
+    response_class=Response,
+    summary="Descargar el catálogo activo completo",
+    description=(
+        "Devuelve en un único JSON todos los productos activos y el `next_token` con el que "
+        "seguir por `GET /products/changes`. Es un archivo precalculado que se regenera en "
+        "segundo plano tras los cambios, así que servirlo no consulta la BD. Admite "
+        "`Accept-Encoding: gzip`, `If-None-Match` y descargas parciales con `Range`."
+    ),
+)
+def read_catalog_snapshot(
+    request: Request,
+    if_none_match: str | None = Header(None),
+    range_header: str | None = Header(None, alias="Range"),
+    if_range: str | None = Header(None),
+) -> Response:
+    """Sirve el snapshot del catálogo activo"""
+    # Síncrona a propósito: `current()` lee del disco (stat, open, mmap), así que
+    # se ejecuta en el pool de hilos y no en el bucle de eventos.
+    snapshot = catalog_snapshot.current()
+    if snapshot is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="El snapshot del catálogo aún no está disponible.",
+            headers={"Retry-After": "2"},
+        )
+
+    use_gzip = snapshot.gzip_body is not None and "gzip" in request.headers.get(
+        "accept-encoding", ""
+    )
+    body = snapshot.gzip_body if use_gzip else snapshot.body
+    etag = f'"{snapshot.version}-gz"' if use_gzip else f'"{snapshot.version}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding",
+        "Accept-Ranges": "bytes",
+        "X-Snapshot-Count": str(snapshot.count),
+        "X-Sync-Token": snapshot.next_token,
+    }
+    if use_gzip:
+        headers["Content-Encoding"] = "gzip"
+    if if_none_match is not None and etag in if_none_match:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    # Las porciones del mmap se envían sin copiarlas.
+    size = len(body)
+    if range_header is not None and (if_range is None or if_range.strip() == etag):
+        byte_range = _parse_range(range_header, size)
+        if byte_range is None:
+            return Response(
+                status_code=status.HTTP_416_RANGE_NOT_SATISFIABLE,
+                headers={**headers, "Content-Range": f"bytes */{size}"},
+            )
+        start, end = byte_range
+        return Response(
+            content=body[start : end + 1],
+            status_code=status.HTTP_206_PARTIAL_CONTENT,
+            media_type="application/json",
+            headers={**headers, "Content-Range": f"bytes {start}-{end}/{size}"},
+        )
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@router.get(
+    "/autocomplete",
+    response_model=List[product_schema.ProductSuggestion],
+    summary="Autocompletar nombres de productos",
+    description=(
+        "Devuelve los productos activos cuyo nombre empieza por `q`, sin distinguir "
+        "mayúsculas ni tildes y en orden alfabético. Pensado para consultar en cada "
+        "pulsación: responde desde un índice en memoria del servidor, sin consultar la BD."
+    ),
+)
+async def autocomplete_products(
+    q: str = Query(..., min_length=1, max_length=255, description="Prefijo del nombre"),
+    limit: int = Query(10, gt=0, description="Número máximo de sugerencias"),
+) -> List[product_schema.ProductSuggestion]:
+    """Sugiere productos por el prefijo de su nombre"""
+    if not product_name_index.ready:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="El índice de autocompletado aún no está disponible.",
+            headers={"Retry-After": "2"},
+        )
+    return product_name_index.search(q, min(limit, settings.autocomplete_max_results))
+
+
+@router.get(
+    "/facets",
+    response_model=facets_schema.ProductFacets,
+    summary="Conteos por faceta del catálogo",
+    description=(
+        "Devuelve cuántos productos hay por categoría, por rango de precio y con o sin stock, "
+        "con los mismos filtros que el listado (por defecto solo productos activos). Se "
+        "calcula con una única consulta agrupada y se guarda en caché hasta el siguiente "
+        "cambio de productos o categorías."
+    ),
+)
+def read_product_facets(
+    include_inactive: bool = Query(
+        False, description="Incluir productos inactivos en los conteos"
+    ),
+    db: Session = Depends(get_read_db),
+) -> facets_schema.ProductFacets:
+    """Obtiene los conteos por faceta"""
+    return facet_service.get_product_facets(db=db, include_inactive=include_inactive)
 
 
 @router.get(
     "/{product_id}",
-    response_model=product_schema.Product,
+    response_model=Union[product_schema.ProductExpanded, product_schema.Product],
     summary="Obtener un producto por ID",
-    description="Obtiene los detalles de un producto específico por su ID.",
+    description=(
+        "Obtiene los detalles de un producto específico por su ID. Con `expand=category` "
+        "incluye su categoría."
+    ),
 )
 def read_product(
+    response: Response,
     product_id: int = Path(..., gt=0, description="ID del producto"),
-    db: Session = Depends(get_db),
+    include_pending: bool = Query(
+        False,
+        description="Sumar al stock los incrementos aceptados que aún no se han volcado",
+    ),
+    expand: Literal["category"] | None = Query(
+        None, description="`category` para incluir la categoría del producto"
+    ),
+    db: Session = Depends(get_read_db),
 ) -> product_schema.Product:
     """Obtiene un producto por su ID"""
-    return product_service.get_product(db=db, product_id=product_id)
+    product = product_service.get_product(
+        db=db,
+        product_id=product_id,
+        include_pending=include_pending,
+        expand_category=expand == "category",
+    )
+    response.headers["ETag"] = format_etag(product.version)
+    return product
 
 
 @router.put(
@@ -69,19 +335,24 @@ def read_product(
     response_model=product_schema.Product,
     dependencies=[Depends(get_current_token)],
     summary="Actualizar completamente un producto (PUT)",
-    description="Actualiza todos los campos de un producto. Requiere autenticación.",
+    description="Actualiza todos los campos de un producto. Requiere autenticación. Admite If-Match con el ETag para evitar sobrescribir cambios ajenos (412 si no coincide).",
 )
 def put_product(
     product_id: int,
     product: product_schema.ProductCreate,
+    response: Response,
+    expected_version: int | None = Depends(get_if_match_version),
     db: Session = Depends(get_db),
 ) -> product_schema.Product:
     """Actualiza completamente un producto (PUT)"""
-    return product_service.put_product(
+    updated = product_service.put_product(
         db=db,
         product_id=product_id,
         product_in=product,
+        expected_version=expected_version,
     )
+    response.headers["ETag"] = format_etag(updated.version)
+    return updated
 
 
 @router.patch(
@@ -89,19 +360,24 @@ def put_product(
     response_model=product_schema.Product,
     dependencies=[Depends(get_current_token)],
     summary="Actualizar parcialmente un producto (PATCH)",
-    description="Actualiza solo los campos proporcionados de un producto. Requiere autenticación.",
+    description="Actualiza solo los campos proporcionados de un producto. Requiere autenticación. Admite If-Match con el ETag (412 si no coincide).",
 )
 def update_product(
     product_id: int,
     product: product_schema.ProductUpdate,
+    response: Response,
+    expected_version: int | None = Depends(get_if_match_version),
     db: Session = Depends(get_db),
 ) -> product_schema.Product:
     """Actualiza parcialmente un producto (PATCH)"""
-    return product_service.update_product(
+    updated = product_service.update_product(
         db=db,
         product_id=product_id,
         product_update=product,
+        expected_version=expected_version,
     )
+    response.headers["ETag"] = format_etag(updated.version)
+    return updated
 
 
 @router.patch(
@@ -109,7 +385,11 @@ def update_product(
     response_model=product_schema.Product,
     dependencies=[Depends(get_current_token)],
     summary="Aumentar el stock de un producto",
-    description="Aumenta el stock de un producto agregando la cantidad especificada. Requiere autenticación.",
+    description=(
+        "Aumenta el stock de un producto agregando la cantidad especificada. Requiere autenticación. "
+        "Con el buffer de stock activo, el incremento se confirma al quedar en el diario y se aplica "
+        "en el siguiente volcado; el stock devuelto ya lo incluye."
+    ),
 )
 def increase_product_stock(
     product_id: int,
@@ -124,6 +404,36 @@ def increase_product_stock(
     )
 
 
+@router.post(
+    "/{product_id}/image",
+    response_model=product_schema.Product,
+    dependencies=[Depends(get_current_token)],
+    summary="Subir la imagen de un producto",
+    description=(
+        "Guarda la imagen en el servidor (deduplicada por contenido), genera sus miniaturas y "
+        "actualiza `imagen_url` con la variante local. Requiere autenticación. Admite If-Match."
+    ),
+)
+def upload_product_image(
+    product_id: int,
+    request: Request,
+    response: Response,
+    image: UploadFile = File(..., description="Imagen JPEG, PNG, WEBP o GIF"),
+    expected_version: int | None = Depends(get_if_match_version),
+    db: Session = Depends(get_db),
+) -> product_schema.Product:
+    """Sube la imagen de un producto"""
+    updated = product_service.set_product_image(
+        db=db,
+        product_id=product_id,
+        upload=image.file,
+        base_url=settings.public_base_url or str(request.base_url),
+        expected_version=expected_version,
+    )
+    response.headers["ETag"] = format_etag(updated.version)
+    return updated
+
+
 @router.patch(
     "/{product_id}/deactivate",
     response_model=product_schema.Product,
@@ -0,0 +1,33 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+
+from ..database import get_read_db
+from ..dependencies.auth import get_current_token
+from ..profiling import ProfilingRoute
+from ..schemas import inventory as inventory_schema
+from ..services import inventory_service
+
+router = APIRouter(
+    prefix="/reports",
+    tags=["Reports"],
+    dependencies=[Depends(get_current_token)],
+    route_class=ProfilingRoute,
+)
+
+
+@router.get(
+    "/inventory",
+    response_model=inventory_schema.InventoryReport,
+    summary="Valorización del inventario por categoría",
+    description=(
+        "Devuelve, por categoría, el número de productos, los activos, las unidades en stock "
+        "y su valor (precio × stock) de los productos activos, junto con los totales. Se lee "
+        "de un resumen mantenido en cada escritura, sin recorrer la tabla de productos. "
+        "Requiere autenticación."
+    ),
+)
+def read_inventory_report(
+    db: Session = Depends(get_read_db),
+) -> inventory_schema.InventoryReport:
+    """Obtiene la valorización del inventario"""
+    return inventory_service.get_inventory_report(db)
@@ -0,0 +1,82 @@
+from fastapi import APIRouter, Depends, Path, status
+from sqlalchemy.orm import Session
+
+from ..database import get_db
+from ..dependencies.auth import get_current_token
+from ..profiling import ProfilingRoute
+from ..schemas import reservation as reservation_schema
+from ..services import reservation_service
+
+router = APIRouter(
+    prefix="/reservations",
+    tags=["Reservations"],
+    dependencies=[Depends(get_current_token)],
+    route_class=ProfilingRoute,
+)
+
+
+@router.post(
+    "/",
+    response_model=reservation_schema.StockReservation,
+    status_code=status.HTTP_201_CREATED,
+    summary="Reservar stock de un producto",
+    description=(
+        "Descuenta las unidades del stock y las retiene durante `ttl_seconds`. Si no hay stock "
+        "suficiente responde 409. Si no se confirma ni se libera a tiempo, la reserva caduca y "
+        "las unidades vuelven al producto. Requiere autenticación."
+    ),
+)
+def create_reservation(
+    reservation: reservation_schema.StockReservationCreate,
+    db: Session = Depends(get_db),
+) -> reservation_schema.StockReservation:
+    """Reserva stock de un producto"""
+    return reservation_service.reserve_stock(db=db, reservation_in=reservation)
+
+
+@router.get(
+    "/{reservation_id}",
+    response_model=reservation_schema.StockReservation,
+    summary="Obtener una reserva por ID",
+    description="Obtiene el estado de una reserva de stock. Requiere autenticación.",
+)
+def read_reservation(
+    reservation_id: int = Path(..., gt=0, description="ID de la reserva"),
+    db: Session = Depends(get_db),
+) -> reservation_schema.StockReservation:
+    """Obtiene una reserva por su ID"""
+    return reservation_service.get_reservation(db=db, reservation_id=reservation_id)
+
+
+@router.post(
+    "/{reservation_id}/commit",
+    response_model=reservation_schema.StockReservation,
+    summary="Confirmar una reserva",
+    description=(
+        "Confirma la venta de las unidades reservadas. Responde 409 si la reserva ya caducó, "
+        "se liberó o se confirmó. Requiere autenticación."
+    ),
+)
+def commit_reservation(
+    reservation_id: int = Path(..., gt=0, description="ID de la reserva"),
+    db: Session = Depends(get_db),
+) -> reservation_schema.StockReservation:
+    """Confirma una reserva"""
+    return reservation_service.commit_reservation(db=db, reservation_id=reservation_id)
+
+
+@router.post(
+    "/{reservation_id}/release",
+    response_model=reservation_schema.StockReservation,
+    summary="Liberar una reserva",
+    description=(
+        "Cancela la reserva y devuelve sus unidades al stock del producto. Responde 409 si ya "
+        "no está retenida. Requiere autenticación."
+    ),
+)
+def release_reservation(
+    reservation_id: int = Path(..., gt=0, description="ID de la reserva"),
+    db: Session = Depends(get_db),
+) -> reservation_schema.StockReservation:
+    """Libera una reserva"""
+    return reservation_service.release_reservation(db=db, reservation_id=reservation_id)
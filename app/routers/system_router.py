@@ -0,0 +1,125 @@
+from fastapi import APIRouter, Depends, Path
+from fastapi.responses import FileResponse
+
+from ..autocomplete import product_name_index
+from ..catalog_snapshot import catalog_snapshot
+from ..database import primary_breaker, replica_breaker, replica_engine
+from ..dependencies.auth import get_current_token
+from ..invalidation import invalidation_bus
+from ..middleware.admission import admission_controller
+from ..profiling import get_profile_path, list_profiles
+from ..reservation_sweeper import reservation_sweeper
+from ..single_flight import read_coalescer
+
+router = APIRouter(
+    prefix="/system",
+    tags=["System"],
+    dependencies=[Depends(get_current_token)],
+)
+
+
+@router.get(
+    "/invalidation",
+    summary="Estado del bus de invalidación",
+    description="Muestra el backend del bus, los eventos publicados y recibidos y el retraso de propagación entre workers. Requiere autenticación.",
+)
+def read_invalidation_stats() -> dict:
+    """Métricas del bus de invalidación de este worker"""
+    return invalidation_bus.stats()
+
+
+@router.get(
+    "/admission",
+    summary="Estado del control de admisión",
+    description="Muestra, para lecturas y escrituras, las peticiones en curso, la profundidad de la cola y cuántas se descartaron con 503. Requiere autenticación.",
+)
+def read_admission_stats() -> dict:
+    """Métricas del control de admisión de este worker"""
+    return admission_controller.stats()
+
+
+@router.get(
+    "/database",
+    summary="Estado del cortacircuitos de la BD",
+    description="Muestra, para la BD principal y la réplica, si el cortacircuitos está abierto, los errores seguidos, las consultas que superaron su tiempo máximo y las peticiones rechazadas con 503. Requiere autenticación.",
+)
+def read_database_stats() -> dict:
+    """Métricas del cortacircuitos de la BD de este worker"""
+    return {
+        "primary": primary_breaker.stats(),
+        "replica": replica_breaker.stats() if replica_engine is not None else None,
+    }
+
+
+@router.get(
+    "/coalescing",
+    summary="Estado de la agrupación de lecturas",
+    description="Muestra cuántas consultas se ejecutaron contra la BD y cuántas peticiones idénticas concurrentes reutilizaron su resultado. Requiere autenticación.",
+)
+def read_coalescing_stats() -> dict:
+    """Métricas de la agrupación de lecturas de este worker"""
+    return read_coalescer.stats()
+
+
+@router.get(
+    "/catalog-snapshot",
+    summary="Estado del snapshot del catálogo",
+    description="Muestra la versión publicada del snapshot del catálogo, cuántas veces se regeneró en este worker y si hay cambios pendientes. Requiere autenticación.",
+)
+def read_catalog_snapshot_stats() -> dict:
+    """Métricas del snapshot del catálogo de este worker"""
+    return catalog_snapshot.stats()
+
+
+@router.get(
+    "/autocomplete",
+    summary="Estado del índice de autocompletado",
+    description="Muestra cuántos nombres de productos tiene el índice de autocompletado de este worker, cuánto tardó en cargarse y cuántos cambios aplicó desde entonces. Requiere autenticación.",
+)
+def read_autocomplete_stats() -> dict:
+    """Métricas del índice de autocompletado de este worker"""
+    return product_name_index.stats()
+
+
+@router.get(
+    "/reservations",
+    summary="Estado del barrido de reservas",
+    description="Muestra cuántas reservas de stock caducó y purgó el barrido de este worker y cuánto tardó el último. Requiere autenticación.",
+)
+def read_reservation_sweeper_stats() -> dict:
+    """Métricas del barrido de reservas de este worker"""
+    return reservation_sweeper.stats()
+
+
+@router.get(
+    "/profiles",
+    summary="Listar los perfiles de peticiones",
+    description=(
+        "Lista los perfiles guardados por el perfilado bajo demanda (cabecera `X-Profile: 1` "
+        "con token, o muestreo), del más reciente al más antiguo, con su ruta y latencia. "
+        "Requiere autenticación."
+    ),
+)
+def read_profiles() -> list[dict]:
+    """Perfiles guardados en este servidor"""
+    return list_profiles()
+
+
+@router.get(
+    "/profiles/{name}",
+    response_class=FileResponse,
+    summary="Descargar un perfil",
+    description=(
+        "Descarga un perfil en formato pstats (`python -m pstats <archivo>`, snakeviz...). "
+        "Requiere autenticación."
+    ),
+)
+def download_profile(
+    name: str = Path(..., description="Nombre del perfil tal como aparece en el listado"),
+) -> FileResponse:
+    """Descarga un perfil guardado"""
+    return FileResponse(
+        get_profile_path(name),
+        media_type="application/octet-stream",
+        filename=name,
+    )
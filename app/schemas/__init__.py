@@ -1,8 +1,12 @@
 # Importar las clases de product.py para que estén disponibles
 from .product import (
+    CatalogSnapshot,
     Product,
     ProductBase,
+    ProductChanges,
     ProductCreate,
+    ProductExpanded,
+    ProductSuggestion,
     ProductUpdate,
     StockAdjustment,
 )
@@ -13,4 +17,24 @@ from .category import (
     CategoryBase,
     CategoryCreate,
     CategoryUpdate,
-)
\ No newline at end of file
+)
+
+# Importar las clases de facets.py para que estén disponibles
+from .facets import (
+    CategoryFacet,
+    PriceRangeFacet,
+    ProductFacets,
+    StockFacet,
+)
+
+# Importar las clases de inventory.py para que estén disponibles
+from .inventory import (
+    InventoryCategory,
+    InventoryReport,
+)
+
+# Importar las clases de reservation.py para que estén disponibles
+from .reservation import (
+    StockReservation,
+    StockReservationCreate,
+)
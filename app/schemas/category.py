@@ -64,5 +64,6 @@ class CategoryUpdate(BaseModel):
 
 class Category(CategoryBase):
     category_id: int
+    version: int = Field(..., description="Versión de la categoría (coincide con el ETag)")
 
     model_config = {"from_attributes": True}
\ No newline at end of file
@@ -0,0 +1,31 @@
+from decimal import Decimal
+
+from pydantic import BaseModel, Field
+
+
+class CategoryFacet(BaseModel):
+    category_id: int
+    name: str = Field(..., description="Nombre de la categoría")
+    count: int = Field(..., description="Productos de la categoría")
+
+
+class PriceRangeFacet(BaseModel):
+    min_price: Decimal | None = Field(
+        ..., description="Precio mínimo del rango, incluido (null = sin mínimo)"
+    )
+    max_price: Decimal | None = Field(
+        ..., description="Precio máximo del rango, excluido (null = sin máximo)"
+    )
+    count: int = Field(..., description="Productos con precio en el rango")
+
+
+class StockFacet(BaseModel):
+    in_stock: int = Field(..., description="Productos con stock mayor a 0")
+    out_of_stock: int = Field(..., description="Productos sin stock")
+
+
+class ProductFacets(BaseModel):
+    total: int = Field(..., description="Productos que cumplen los filtros")
+    categories: list[CategoryFacet]
+    price_ranges: list[PriceRangeFacet]
+    stock: StockFacet
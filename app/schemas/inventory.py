@@ -0,0 +1,22 @@
+from decimal import Decimal
+
+from pydantic import BaseModel, Field
+
+
+class InventoryCategory(BaseModel):
+    category_id: int
+    name: str | None = Field(default=None, description="Nombre de la categoría")
+    product_count: int = Field(..., description="Productos de la categoría (activos e inactivos)")
+    active_count: int = Field(..., description="Productos activos")
+    units: int = Field(..., description="Unidades en stock de los productos activos")
+    stock_value: Decimal = Field(
+        ..., description="Valor del stock de los productos activos (precio × stock)"
+    )
+
+
+class InventoryReport(BaseModel):
+    categories: list[InventoryCategory]
+    total_products: int
+    total_active: int
+    total_units: int
+    total_value: Decimal
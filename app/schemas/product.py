@@ -3,6 +3,8 @@ from decimal import Decimal
 
 from pydantic import BaseModel, Field, HttpUrl, condecimal, field_validator, model_validator
 
+from .category import Category
+
 
 def _quantize_price(value: Decimal) -> Decimal:
     return value.quantize(Decimal("0.01"))
@@ -169,5 +171,39 @@ class Product(ProductBase):
     active: bool = Field(..., description="Estado activo/inactivo del producto")
     created_at: datetime
     updated_at: datetime
+    version: int = Field(..., description="Versión del producto (coincide con el ETag)")
+
+    model_config = {"from_attributes": True}
+
+
+class ProductExpanded(Product):
+    category: Category = Field(..., description="Categoría del producto (expand=category)")
+
+
+class ProductChanges(BaseModel):
+    changes: list[Product] = Field(
+        ..., description="Productos creados o modificados desde el token, en orden"
+    )
+    deleted: list[int] = Field(
+        ..., description="IDs de productos eliminados desde el token"
+    )
+    next_token: str | None = Field(
+        ..., description="Token para la siguiente llamada (since=...)"
+    )
+    has_more: bool = Field(
+        ..., description="Hay más cambios: volver a llamar con next_token"
+    )
+
+
+class CatalogSnapshot(BaseModel):
+    next_token: str = Field(
+        ..., description="Token para seguir sincronizando con GET /products/changes?since=..."
+    )
+    products: list[Product] = Field(..., description="Todos los productos activos")
+
+
+class ProductSuggestion(BaseModel):
+    product_id: int
+    name: str = Field(..., description="Nombre del producto tal como está guardado")
 
     model_config = {"from_attributes": True}
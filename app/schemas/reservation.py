@@ -0,0 +1,24 @@
+from datetime import datetime
+
+from pydantic import BaseModel, Field
+
+
+class StockReservationCreate(BaseModel):
+    product_id: int = Field(..., gt=0, description="ID del producto a reservar")
+    quantity: int = Field(..., gt=0, description="Unidades a reservar (debe ser mayor a 0)")
+    ttl_seconds: int | None = Field(
+        default=None,
+        gt=0,
+        description="Segundos que dura la reserva (por defecto, el configurado en el servidor)",
+    )
+
+
+class StockReservation(BaseModel):
+    reservation_id: int
+    product_id: int
+    quantity: int
+    status: str = Field(..., description="held, committed, released o expired")
+    created_at: datetime
+    expires_at: datetime = Field(..., description="Momento en que caduca si no se confirma")
+
+    model_config = {"from_attributes": True}
@@ -4,6 +4,9 @@ from fastapi import HTTPException, status
 from sqlalchemy.orm import Session
 
 from .. import models, schemas
+from ..invalidation import invalidation_bus
+from ..single_flight import read_bind_key, read_coalescer
+from . import inventory_service
 
 
 def _normalize_name(name: str) -> str:
@@ -25,6 +28,12 @@ def create_category(db: Session, category: schemas.CategoryCreate) -> models.Cat
 
     db_category = models.Category(name=category.name)
     db.add(db_category)
+    db.flush()
+    # Con su fila de resumen, los totales de productos siguen saliendo de él.
+    inventory_service.add_empty_category(db, db_category.category_id)
+    invalidation_bus.publish(
+        db, "category", db_category.category_id, db_category.version, "create"
+    )
     db.commit()
     db.refresh(db_category)
     return db_category
@@ -32,14 +41,19 @@ def create_category(db: Session, category: schemas.CategoryCreate) -> models.Cat
 
 def get_categories(
     db: Session, skip: int = 0, limit: int = 100
-) -> List[models.Category]:
-    return (
-        db.query(models.Category)
-        .order_by(models.Category.name.asc())
-        .offset(skip)
-        .limit(limit)
-        .all()
-    )
+) -> List[schemas.Category]:
+    def load() -> List[schemas.Category]:
+        categories = (
+            db.query(models.Category)
+            .order_by(models.Category.name.asc())
+            .offset(skip)
+            .limit(limit)
+            .all()
+        )
+        return [schemas.Category.model_validate(category) for category in categories]
+
+    key = ("categories", read_bind_key(db), skip, limit)
+    return read_coalescer.do(key, load)
 
 
 def get_category(db: Session, category_id: int) -> models.Category:
@@ -56,10 +70,46 @@ def get_category(db: Session, category_id: int) -> models.Category:
     return category
 
 
+def _update_category_row(
+    db: Session,
+    category_id: int,
+    values: dict,
+    expected_version: int | None = None,
+) -> None:
+    """Un único `UPDATE`; con versión esperada, 412 si ya no es la actual."""
+    query = db.query(models.Category).filter(
+        models.Category.category_id == category_id
+    )
+    if expected_version is not None:
+        query = query.filter(models.Category.version == expected_version)
+
+    updated = query.update(
+        {**values, "version": models.Category.version + 1},
+        synchronize_session=False,
+    )
+    if not updated:
+        get_category(db, category_id)
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail="La categoría fue modificada por otra petición. Vuelva a leerla e inténtelo de nuevo.",
+        )
+
+
+def _publish_and_commit(db: Session, category: models.Category) -> models.Category:
+    """Publica el cambio en el bus y confirma; la categoría ya tiene los valores
+    confirmados, así que se devuelve sin releerla tras el commit."""
+    invalidation_bus.publish(db, "category", category.category_id, category.version)
+    db.expunge(category)
+    db.commit()
+    return category
+
+
 def update_category(
-    db: Session, category_id: int, category_update: schemas.CategoryUpdate
+    db: Session,
+    category_id: int,
+    category_update: schemas.CategoryUpdate,
+    expected_version: int | None = None,
 ) -> models.Category:
-    category = get_category(db, category_id)
     normalized_name = _normalize_name(category_update.name)
     
     # Verificar si existe otra categoría con el mismo nombre
@@ -77,18 +127,17 @@ def update_category(
             detail=f"Ya existe una categoría con el nombre '{category_update.name}'.",
         )
 
-    category.name = category_update.name
-    db.add(category)
-    db.commit()
-    db.refresh(category)
-    return category
+    _update_category_row(db, category_id, {"name": category_update.name}, expected_version)
+    return _publish_and_commit(db, get_category(db, category_id))
 
 
 def put_category(
-    db: Session, category_id: int, category_in: schemas.CategoryCreate
+    db: Session,
+    category_id: int,
+    category_in: schemas.CategoryCreate,
+    expected_version: int | None = None,
 ) -> models.Category:
     """Actualiza completamente una categoría (PUT)"""
-    category = get_category(db, category_id)
     normalized_name = _normalize_name(category_in.name)
     
     # Verificar si existe otra categoría con el mismo nombre
@@ -106,11 +155,8 @@ def put_category(
             detail=f"Ya existe una categoría con el nombre '{category_in.name}'.",
         )
 
-    category.name = category_in.name
-    db.add(category)
-    db.commit()
-    db.refresh(category)
-    return category
+    _update_category_row(db, category_id, {"name": category_in.name}, expected_version)
+    return _publish_and_commit(db, get_category(db, category_id))
 
 
 def delete_category(db: Session, category_id: int) -> None:
@@ -131,4 +177,5 @@ def delete_category(db: Session, category_id: int) -> None:
         )
     
     db.delete(category)
+    invalidation_bus.publish(db, "category", category_id, None, "delete")
     db.commit()
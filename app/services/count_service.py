@@ -0,0 +1,131 @@
+"""Totales para la cabecera `X-Total-Count` de los listados.
+
+El total se obtiene, de más barato a más caro:
+
+1. De la propia página: si vino incompleta, el total es exacto y gratis.
+2. De la caché del worker, si no tiene más de `total_count_max_staleness_seconds`.
+3. Productos: de `inventory_summary`, que ya lleva el número de productos (y de
+   activos) por categoría; cuesta O(categorías). Las categorías que aún no
+   tienen fila (datos anteriores a la tabla) se cuentan aparte.
+4. Categorías: un `COUNT(*)` de la tabla, que es pequeña.
+
+Todos los totales son exactos. Las altas y bajas publicadas en el bus de
+invalidación vacían la caché de su entidad, igual que las modificaciones de
+productos que cambian `active` o `category_id`; un total calculado antes de
+la invalidación ya no se guarda.
+"""
+
+import threading
+import time
+from collections.abc import Callable
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..config import settings
+from ..invalidation import ChangeEvent, invalidation_bus
+from ..single_flight import read_bind_key, read_coalescer
+
+
+_cache_lock = threading.Lock()
+_cache: dict[tuple, tuple[int, float]] = {}
+# Sube con cada invalidación de la entidad: un cálculo que empezó antes no se guarda.
+_generations: dict[str, int] = {}
+# product_id -> (active, category_id) según el último evento visto del producto.
+_product_states: dict[int, tuple[bool, int]] = {}
+
+
+def _changes_total(change: ChangeEvent) -> bool:
+    """True si el cambio puede mover los totales de su entidad."""
+    if change.entity != "product":
+        return change.action in ("create", "delete")
+    if change.action == "delete":
+        _product_states.pop(change.entity_id, None)
+        return True
+    if change.data is None:
+        return True
+    state = (change.data.get("active"), change.data.get("category_id"))
+    previous = _product_states.get(change.entity_id)
+    _product_states[change.entity_id] = state
+    # De un producto sin estado previo no se sabe qué cambió: se invalida.
+    return change.action == "create" or previous != state
+
+
+def _on_change(change: ChangeEvent) -> None:
+    with _cache_lock:
+        if not _changes_total(change):
+            return
+        _generations[change.entity] = _generations.get(change.entity, 0) + 1
+        for key in [key for key in _cache if key[0] == change.entity]:
+            del _cache[key]
+
+
+invalidation_bus.subscribe(_on_change)
+
+
+def _from_page(skip: int, limit: int, page_size: int) -> int | None:
+    if page_size < limit and (page_size > 0 or skip == 0):
+        return skip + page_size
+    return None
+
+
+def _cached(key: tuple, compute: Callable[[], int]) -> int:
+    now = time.monotonic()
+    with _cache_lock:
+        hit = _cache.get(key)
+        generation = _generations.get(key[0], 0)
+    if hit is not None and now - hit[1] <= settings.total_count_max_staleness_seconds:
+        return hit[0]
+
+    total = read_coalescer.do(("total",) + key, compute)
+    with _cache_lock:
+        if generation == _generations.get(key[0], 0):
+            _cache[key] = (total, now)
+    return total
+
+
+def _products_from_summary(db: Session, include_inactive: bool) -> int:
+    """Suma de `inventory_summary` más un conteo de las categorías aún sin fila."""
+    summary = models.InventorySummary
+    products, active = db.query(
+        func.coalesce(func.sum(summary.product_count), 0),
+        func.coalesce(func.sum(summary.active_count), 0),
+    ).one()
+    total = products if include_inactive else active
+
+    missing = db.query(models.Category.category_id).filter(
+        ~models.Category.category_id.in_(db.query(summary.category_id))
+    )
+    if missing.first() is not None:
+        query = db.query(func.count(models.Product.product_id)).filter(
+            models.Product.category_id.in_(missing)
+        )
+        if not include_inactive:
+            query = query.filter(models.Product.active.is_(True))
+        total += query.scalar()
+    return int(total)
+
+
+def product_total(
+    db: Session, skip: int, limit: int, page_size: int, include_inactive: bool
+) -> int:
+    total = _from_page(skip, limit, page_size)
+    if total is not None:
+        return total
+
+    def compute() -> int:
+        return _products_from_summary(db, include_inactive)
+
+    return _cached(("product", read_bind_key(db), include_inactive), compute)
+
+
+def category_total(db: Session, skip: int, limit: int, page_size: int) -> int:
+    total = _from_page(skip, limit, page_size)
+    if total is not None:
+        return total
+
+    def compute() -> int:
+        return db.query(func.count(models.Category.category_id)).scalar()
+
+    return _cached(("category", read_bind_key(db)), compute)
@@ -0,0 +1,114 @@
+"""Conteos por faceta para los filtros del catálogo.
+
+Una sola consulta agrupada por categoría, rango de precio y si hay stock
+devuelve a lo sumo categorías × rangos × 2 filas; de ellas se suman en Python
+los conteos de cada faceta.
+
+El resultado queda en la caché del worker por combinación de filtros. Cualquier
+cambio de productos o categorías publicado en el bus la vacía; además cada
+entrada caduca tras `facet_cache_max_age_seconds`.
+"""
+
+import threading
+import time
+from collections import defaultdict
+
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+
+from .. import models, schemas
+from ..config import settings
+from ..invalidation import ChangeEvent, invalidation_bus
+from ..single_flight import read_bind_key, read_coalescer
+
+_cache_lock = threading.Lock()
+_cache: dict[tuple, tuple[schemas.ProductFacets, float]] = {}
+# Sube con cada invalidación: un cálculo que empezó antes no se guarda.
+_generation = 0
+
+
+def _on_change(change: ChangeEvent) -> None:
+    global _generation
+    if change.entity not in ("product", "category"):
+        return
+    with _cache_lock:
+        _generation += 1
+        _cache.clear()
+
+
+invalidation_bus.subscribe(_on_change)
+
+
+def _price_ranges() -> list[tuple]:
+    bounds = sorted(settings.facet_price_bounds)
+    return list(zip([None, *bounds], [*bounds, None]))
+
+
+def _compute(db: Session, include_inactive: bool) -> schemas.ProductFacets:
+    product = models.Product
+    ranges = _price_ranges()
+    # Índice del rango de precio de cada producto.
+    price_range = case(
+        *(
+            (product.price < max_price, index)
+            for index, (_, max_price) in enumerate(ranges[:-1])
+        ),
+        else_=len(ranges) - 1,
+    ).label("price_range")
+    in_stock = case((product.stock > 0, 1), else_=0).label("in_stock")
+
+    query = (
+        db.query(
+            product.category_id,
+            models.Category.name,
+            price_range,
+            in_stock,
+            func.count(product.product_id),
+        )
+        .join(models.Category, models.Category.category_id == product.category_id)
+        .group_by(product.category_id, models.Category.name, price_range, in_stock)
+    )
+    if not include_inactive:
+        query = query.filter(product.active.is_(True))
+
+    categories: dict[int, list] = {}
+    range_counts: dict[int, int] = defaultdict(int)
+    stock_counts: dict[int, int] = defaultdict(int)
+    for category_id, name, range_index, has_stock, count in query.all():
+        categories.setdefault(category_id, [name, 0])[1] += count
+        range_counts[range_index] += count
+        stock_counts[has_stock] += count
+
+    return schemas.ProductFacets(
+        total=sum(stock_counts.values()),
+        categories=[
+            schemas.CategoryFacet(category_id=category_id, name=name, count=count)
+            for category_id, (name, count) in sorted(
+                categories.items(), key=lambda item: item[1][0]
+            )
+        ],
+        price_ranges=[
+            schemas.PriceRangeFacet(
+                min_price=min_price, max_price=max_price, count=range_counts[index]
+            )
+            for index, (min_price, max_price) in enumerate(ranges)
+        ],
+        stock=schemas.StockFacet(in_stock=stock_counts[1], out_of_stock=stock_counts[0]),
+    )
+
+
+def get_product_facets(db: Session, include_inactive: bool = False) -> schemas.ProductFacets:
+    """Conteos por categoría, rango de precio y stock con los filtros del listado."""
+    key = ("facets", read_bind_key(db), include_inactive)
+    now = time.monotonic()
+    with _cache_lock:
+        hit = _cache.get(key)
+        generation = _generation
+    if hit is not None and now - hit[1] <= settings.facet_cache_max_age_seconds:
+        return hit[0]
+
+    facets = read_coalescer.do(key, lambda: _compute(db, include_inactive))
+    with _cache_lock:
+        if generation == _generation:
+            _cache[key] = (facets, now)
+    return facets
@@ -0,0 +1,110 @@
+import hashlib
+import io
+import os
+import re
+from typing import BinaryIO
+
+from fastapi import HTTPException, status
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from ..config import settings
+from ..file_io import write_atomic
+
+_ORIGINAL_EXTENSIONS = {"JPEG": "jpg", "PNG": "png", "WEBP": "webp", "GIF": "gif"}
+_DIGEST_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+_FILENAME_PATTERN = re.compile(r"^(original\.(jpg|png|webp|gif)|\d+\.jpg)$")
+
+
+def _image_dir(digest: str) -> str:
+    return os.path.join(settings.media_root, "images", digest[:2], digest)
+
+
+def _variant_sizes() -> list[int]:
+    return sorted(set(settings.image_variant_sizes) | {settings.image_default_variant})
+
+
+def _write_once(path: str, data: bytes) -> None:
+    """Escribe el archivo de forma atómica; si ya existe no se vuelve a escribir."""
+    if not os.path.exists(path):
+        write_atomic(path, data)
+
+
+def _render_variant(image: Image.Image, size: int) -> bytes:
+    variant = image.copy()
+    variant.thumbnail((size, size))
+    if variant.mode not in ("RGB", "L"):
+        # JPEG no admite transparencia: se compone sobre fondo blanco.
+        rgba = variant.convert("RGBA")
+        variant = Image.new("RGB", rgba.size, (255, 255, 255))
+        variant.paste(rgba, mask=rgba.getchannel("A"))
+    buffer = io.BytesIO()
+    variant.save(buffer, format="JPEG", quality=85, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def read_upload(upload: BinaryIO) -> bytes:
+    data = upload.read(settings.image_max_bytes + 1)
+    if len(data) > settings.image_max_bytes:
+        raise HTTPException(
+            status_code=status.HTTP_413_CONTENT_TOO_LARGE,
+            detail=f"La imagen no puede superar {settings.image_max_bytes} bytes.",
+        )
+    if not data:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="El archivo de imagen está vacío.",
+        )
+    return data
+
+
+def store_image(data: bytes) -> str:
+    """Guarda la imagen bajo su hash SHA-256 y genera sus miniaturas.
+
+    Si ya existe una imagen con el mismo contenido se reutiliza tal cual.
+    Devuelve el hash, que forma parte de la URL de cada variante.
+    """
+    digest = hashlib.sha256(data).hexdigest()
+    directory = _image_dir(digest)
+
+    try:
+        with Image.open(io.BytesIO(data)) as probe:
+            probe.verify()
+        image = Image.open(io.BytesIO(data))
+        image.load()
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="El archivo no es una imagen válida.",
+        ) from exc
+
+    extension = _ORIGINAL_EXTENSIONS.get(image.format)
+    if extension is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Formato de imagen no soportado (use JPEG, PNG, WEBP o GIF).",
+        )
+
+    os.makedirs(directory, exist_ok=True)
+    _write_once(os.path.join(directory, f"original.{extension}"), data)
+
+    image = ImageOps.exif_transpose(image)
+    for size in _variant_sizes():
+        path = os.path.join(directory, f"{size}.jpg")
+        if not os.path.exists(path):
+            _write_once(path, _render_variant(image, size))
+    return digest
+
+
+def image_url(base_url: str, digest: str) -> str:
+    return f"{base_url.rstrip('/')}/images/{digest}/{settings.image_default_variant}.jpg"
+
+
+def get_image_path(digest: str, filename: str) -> str:
+    if _DIGEST_PATTERN.match(digest) and _FILENAME_PATTERN.match(filename):
+        path = os.path.join(_image_dir(digest), filename)
+        if os.path.isfile(path):
+            return path
+    raise HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail="Imagen no encontrada.",
+    )
@@ -0,0 +1,357 @@
+"""Valorización del inventario (precio × stock) por categoría.
+
+La tabla `inventory_summary` no se recalcula: cada escritura de productos
+calcula el aporte del producto antes y después del cambio y suma la diferencia
+a la fila de su categoría, en la misma transacción. El reporte solo lee una
+fila por categoría.
+
+Para comprobar (y corregir) desviaciones frente al cálculo completo:
+
+    python -m app.services.inventory_service [--check]
+"""
+
+import argparse
+from collections import defaultdict
+from collections.abc import Iterable
+from dataclasses import dataclass, replace
+from decimal import Decimal
+
+from sqlalchemy import case, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .. import models, schemas
+from ..database import in_lock_order
+
+_ZERO = Decimal("0.00")
+
+
+@dataclass(frozen=True)
+class StockContribution:
+    """Lo que un producto aporta al resumen de su categoría."""
+
+    category_id: int
+    price: Decimal
+    stock: int
+    active: bool
+
+    @property
+    def units(self) -> int:
+        return self.stock if self.active else 0
+
+    @property
+    def value(self) -> Decimal:
+        return self.price * self.units
+
+
+def contribution(product: models.Product) -> StockContribution:
+    return StockContribution(
+        category_id=product.category_id,
+        price=Decimal(product.price),
+        stock=product.stock,
+        active=bool(product.active),
+    )
+
+
+def with_stock_delta(after: StockContribution, quantity: int) -> StockContribution:
+    """Aporte previo a un incremento de stock, a partir del posterior."""
+    return replace(after, stock=after.stock - quantity)
+
+
+def with_active_toggled(after: StockContribution) -> StockContribution:
+    """Aporte previo a una activación o desactivación, a partir del posterior."""
+    return replace(after, active=not after.active)
+
+
+def read_contribution(
+    db: Session, product_id: int, lock: bool = False
+) -> tuple[StockContribution, int] | None:
+    """Lee el aporte actual de un producto y su versión (con `lock`, bloqueando la fila)."""
+    query = db.query(
+        models.Product.category_id,
+        models.Product.price,
+        models.Product.stock,
+        models.Product.active,
+        models.Product.version,
+    ).filter(models.Product.product_id == product_id)
+    if lock:
+        query = query.with_for_update()
+    row = query.first()
+    if row is None:
+        return None
+    return _row_contribution(row), row.version
+
+
+def lock_contribution(db: Session, product_id: int) -> StockContribution | None:
+    """Lee (y bloquea hasta el commit) el aporte actual de un producto."""
+    row = (
+        db.query(
+            models.Product.category_id,
+            models.Product.price,
+            models.Product.stock,
+            models.Product.active,
+        )
+        .filter(models.Product.product_id == product_id)
+        .with_for_update()
+        .first()
+    )
+    if row is None:
+        return None
+    return _row_contribution(row)
+
+
+def _row_contribution(row) -> StockContribution:
+    return StockContribution(
+        category_id=row.category_id,
+        price=Decimal(row.price),
+        stock=row.stock,
+        active=bool(row.active),
+    )
+
+
+def apply_change(
+    db: Session,
+    before: StockContribution | None,
+    after: StockContribution | None,
+) -> None:
+    """Suma al resumen la diferencia entre dos aportes (None = no existe)."""
+    apply_changes(db, [(before, after)])
+
+
+def apply_changes(
+    db: Session,
+    changes: Iterable[tuple[StockContribution | None, StockContribution | None]],
+) -> None:
+    """Como `apply_change` para varios productos, con una sola `UPDATE` por categoría."""
+    deltas: dict[int, list] = defaultdict(lambda: [0, 0, 0, _ZERO])
+    for before, after in changes:
+        for sign, item in ((-1, before), (1, after)):
+            if item is None:
+                continue
+            delta = deltas[item.category_id]
+            delta[0] += sign
+            delta[1] += sign * int(item.active)
+            delta[2] += sign * item.units
+            delta[3] += sign * item.value
+
+    for category_id, delta in in_lock_order(deltas):
+        if any(delta):
+            _apply_category_delta(db, category_id, *delta)
+
+
+def add_empty_category(db: Session, category_id: int) -> None:
+    """Fila en cero para una categoría recién creada (aún sin productos)."""
+    db.add(
+        models.InventorySummary(
+            category_id=category_id,
+            product_count=0,
+            active_count=0,
+            units=0,
+            stock_value=_ZERO,
+        )
+    )
+
+
+def _apply_category_delta(
+    db: Session,
+    category_id: int,
+    product_count: int,
+    active_count: int,
+    units: int,
+    stock_value: Decimal,
+) -> None:
+    summary = models.InventorySummary
+    updated = (
+        db.query(summary)
+        .filter(summary.category_id == category_id)
+        .update(
+            {
+                "product_count": summary.product_count + product_count,
+                "active_count": summary.active_count + active_count,
+                "units": summary.units + units,
+                "stock_value": summary.stock_value + stock_value,
+            },
+            synchronize_session=False,
+        )
+    )
+    if updated:
+        return
+
+    # Categoría aún sin fila (p. ej. datos anteriores a esta tabla): se siembra
+    # con el cálculo completo, que ya incluye los cambios de esta transacción.
+    row = _aggregate(db, [category_id]).get(category_id)
+    try:
+        with db.begin_nested():
+            db.add(
+                models.InventorySummary(
+                    category_id=category_id,
+                    product_count=row.product_count if row else 0,
+                    active_count=row.active_count if row else 0,
+                    units=row.units if row else 0,
+                    stock_value=row.stock_value if row else _ZERO,
+                )
+            )
+    except IntegrityError:
+        # Otra transacción la creó a la vez: se le aplica el delta.
+        _apply_category_delta(
+            db, category_id, product_count, active_count, units, stock_value
+        )
+
+
+def _aggregate(
+    db: Session, category_ids: list[int] | None = None
+) -> dict[int, schemas.InventoryCategory]:
+    """Cálculo completo desde `products` (recorre toda la tabla)."""
+    product = models.Product
+    active_units = case((product.active.is_(True), product.stock), else_=0)
+    query = db.query(
+        product.category_id,
+        func.count(product.product_id),
+        func.coalesce(func.sum(case((product.active.is_(True), 1), else_=0)), 0),
+        func.coalesce(func.sum(active_units), 0),
+        func.coalesce(func.sum(product.price * active_units), 0),
+    ).group_by(product.category_id)
+    if category_ids is not None:
+        query = query.filter(product.category_id.in_(category_ids))
+
+    return {
+        row[0]: schemas.InventoryCategory(
+            category_id=row[0],
+            product_count=row[1],
+            active_count=row[2],
+            units=row[3],
+            stock_value=Decimal(row[4]).quantize(_ZERO),
+        )
+        for row in query.all()
+    }
+
+
+def get_inventory_report(db: Session) -> schemas.InventoryReport:
+    """Valorización por categoría leyendo solo `inventory_summary`."""
+    rows = (
+        db.query(models.Category, models.InventorySummary)
+        .outerjoin(
+            models.InventorySummary,
+            models.InventorySummary.category_id == models.Category.category_id,
+        )
+        .order_by(models.Category.name.asc())
+        .all()
+    )
+    # Las categorías sin escrituras desde que existe la tabla se calculan al
+    # vuelo hasta que la primera escritura (o el comando) siembre su fila.
+    missing = [category.category_id for category, summary in rows if summary is None]
+    seeded = _aggregate(db, missing) if missing else {}
+
+    categories = []
+    for category, summary in rows:
+        item = seeded.get(category.category_id) or summary
+        categories.append(
+            schemas.InventoryCategory(
+                category_id=category.category_id,
+                name=category.name,
+                product_count=item.product_count if item else 0,
+                active_count=item.active_count if item else 0,
+                units=item.units if item else 0,
+                stock_value=item.stock_value if item else _ZERO,
+            )
+        )
+
+    return schemas.InventoryReport(
+        categories=categories,
+        total_products=sum(item.product_count for item in categories),
+        total_active=sum(item.active_count for item in categories),
+        total_units=sum(item.units for item in categories),
+        total_value=sum((item.stock_value for item in categories), _ZERO),
+    )
+
+
+def rebuild_inventory_summary(db: Session, apply: bool = True) -> list[dict]:
+    """Recalcula el resumen desde cero y devuelve las filas que no coincidían.
+
+    Bloquea antes las filas del resumen: las escrituras concurrentes esperan y
+    aplican su delta sobre el valor ya recalculado.
+    """
+    current = {
+        summary.category_id: summary
+        for summary in db.query(models.InventorySummary).with_for_update().all()
+    }
+    expected = _aggregate(db)
+    category_ids = {
+        category_id for (category_id,) in db.query(models.Category.category_id)
+    }
+
+    fields = ("product_count", "active_count", "units", "stock_value")
+    drift = []
+    for category_id in sorted(category_ids | current.keys()):
+        summary = current.get(category_id)
+        row = expected.get(category_id)
+        actual_values = {
+            field: getattr(summary, field) if summary else 0 for field in fields
+        }
+        expected_values = {
+            field: getattr(row, field) if row else 0 for field in fields
+        }
+        if summary is None or any(
+            Decimal(actual_values[field]) != Decimal(expected_values[field])
+            for field in fields
+        ):
+            drift.append(
+                {
+                    "category_id": category_id,
+                    "actual": None if summary is None else actual_values,
+                    "expected": expected_values,
+                }
+            )
+        if not apply:
+            continue
+        if category_id not in category_ids:
+            db.delete(summary)
+        elif summary is None:
+            db.add(models.InventorySummary(category_id=category_id, **expected_values))
+        else:
+            for field, value in expected_values.items():
+                setattr(summary, field, value)
+
+    if apply:
+        db.commit()
+    else:
+        db.rollback()
+    return drift
+
+
+def main() -> None:
+    from ..database import SessionLocal
+
+    parser = argparse.ArgumentParser(
+        description="Recalcula inventory_summary desde products e informa las desviaciones."
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Solo informar las desviaciones, sin corregirlas.",
+    )
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        drift = rebuild_inventory_summary(db, apply=not args.check)
+    finally:
+        db.close()
+
+    for item in drift:
+        print(
+            f"Categoría {item['category_id']}: "
+            f"resumen={item['actual']} cálculo={item['expected']}"
+        )
+    if not drift:
+        print("Sin desviaciones: inventory_summary coincide con products.")
+    elif args.check:
+        print(f"{len(drift)} categoría(s) con desviación (sin corregir).")
+    else:
+        print(f"{len(drift)} categoría(s) corregida(s).")
+    if args.check and drift:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,19 @@
+import base64
 from collections.abc import Sequence
+from datetime import datetime, timedelta
 from decimal import Decimal
+from typing import BinaryIO
 
 from fastapi import HTTPException, status
+from sqlalchemy import and_, func, or_
 from sqlalchemy.orm import Session, joinedload
 
 from .. import models, schemas
-
+from ..config import settings
+from ..invalidation import invalidation_bus
+from ..single_flight import read_bind_key, read_coalescer
+from ..stock_buffer import stock_buffer
+from . import image_service, inventory_service
 
 def _get_category_or_404(db: Session, category_id: int) -> models.Category:
     category = (
@@ -21,13 +29,13 @@ def _get_category_or_404(db: Session, category_id: int) -> models.Category:
     return category
 
 
-def _get_product_or_404(db: Session, product_id: int) -> models.Product:
-    product = (
-        db.query(models.Product)
-        .options(joinedload(models.Product.category))
-        .filter(models.Product.product_id == product_id)
-        .first()
-    )
+def _get_product_or_404(
+    db: Session, product_id: int, with_category: bool = False
+) -> models.Product:
+    query = db.query(models.Product)
+    if with_category:
+        query = query.options(joinedload(models.Product.category))
+    product = query.filter(models.Product.product_id == product_id).first()
     if product is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -36,6 +44,130 @@ def _get_product_or_404(db: Session, product_id: int) -> models.Product:
     return product
 
 
+def _try_update_product_row(
+    db: Session,
+    product_id: int,
+    values: dict,
+    expected_version: int | None = None,
+    unchanged: dict | None = None,
+) -> bool:
+    """Un único `UPDATE ... WHERE product_id = :id [AND version = :v]`.
+
+    `unchanged` añade al WHERE columnas que deben conservar ese valor.
+    Devuelve False si no se actualizó ninguna fila (no existe, cambió la
+    versión o alguna de esas columnas).
+    """
+    query = db.query(models.Product).filter(models.Product.product_id == product_id)
+    if expected_version is not None:
+        query = query.filter(models.Product.version == expected_version)
+    for field, value in (unchanged or {}).items():
+        query = query.filter(getattr(models.Product, field) == value)
+
+    updated = query.update(
+        {**values, "version": models.Product.version + 1},
+        synchronize_session=False,
+    )
+    return bool(updated)
+
+
+def _raise_version_conflict(db: Session, product_id: int) -> None:
+    _get_product_or_404(db, product_id)
+    raise HTTPException(
+        status_code=status.HTTP_412_PRECONDITION_FAILED,
+        detail="El producto fue modificado por otra petición. Vuelva a leerlo e inténtelo de nuevo.",
+    )
+
+
+def _update_product_row(
+    db: Session,
+    product_id: int,
+    values: dict,
+    expected_version: int | None = None,
+) -> None:
+    """Como `_try_update_product_row`, respondiendo 404 o 412 si no actualizó nada.
+
+    Sin lectura previa ni bloqueos: si el cliente envió una versión y ya no es
+    la actual, no se actualiza ninguna fila y se responde 412.
+    """
+    if not _try_update_product_row(db, product_id, values, expected_version):
+        _raise_version_conflict(db, product_id)
+
+
+def _publish_and_commit(
+    db: Session, product: models.Product, action: str = "update"
+) -> models.Product:
+    """Publica el cambio en el bus dentro de la transacción y la confirma.
+
+    El producto ya tiene los valores que se van a confirmar, así que se separa
+    de la sesión antes del commit para devolverlo sin tener que releerlo.
+    """
+    invalidation_bus.publish(
+        db,
+        "product",
+        product.product_id,
+        product.version,
+        action,
+        product.event_payload(),
+    )
+    db.expunge(product)
+    db.commit()
+    return product
+
+
+def _update_and_track_inventory(
+    db: Session,
+    product_id: int,
+    values: dict,
+    expected_version: int | None = None,
+) -> models.Product:
+    """`_update_product_row` ajustando el resumen de inventario si hace falta.
+
+    Solo el precio y la categoría cambian la valorización. Primero se intenta
+    el `UPDATE` condicionado a que ambos conserven el valor recibido (un PUT
+    que solo edita el nombre, por ejemplo): si actualiza, el resumen no cambia
+    y no hace falta leer nada antes. Si no, se comprueba la categoría nueva, se
+    lee el aporte del producto y su versión, y el `UPDATE` se condiciona a esa
+    versión:
+
+    - Con If-Match la lectura no bloquea: si la versión no es la pedida, o
+      otra escritura se adelanta, se responde 412.
+    - Sin If-Match gana la última escritura: la lectura bloquea la fila (el
+      `UPDATE` la bloquearía de todos modos), así que ninguna escritura
+      concurrente deja viejo el aporte leído. Donde no hay bloqueo de filas
+      (SQLite) se vuelve a leer hasta que el `UPDATE` encuentra la versión.
+    """
+    if "price" not in values and "category_id" not in values:
+        _update_product_row(db, product_id, values, expected_version)
+        return _publish_and_commit(db, _get_product_or_404(db, product_id))
+
+    unchanged = {
+        field: values[field] for field in ("price", "category_id") if field in values
+    }
+    if _try_update_product_row(db, product_id, values, expected_version, unchanged):
+        return _publish_and_commit(db, _get_product_or_404(db, product_id))
+    if "category_id" in values:
+        _get_category_or_404(db, values["category_id"])
+
+    locked = expected_version is None
+    while True:
+        read = inventory_service.read_contribution(db, product_id, lock=locked)
+        if read is None:
+            _get_product_or_404(db, product_id)  # No existe: responde 404.
+        before, version = read
+        if not locked and version != expected_version:
+            _raise_version_conflict(db, product_id)
+        if _try_update_product_row(db, product_id, values, version):
+            break
+        if not locked:
+            _raise_version_conflict(db, product_id)
+        # Se descarta la instantánea de la transacción para leer la versión nueva.
+        db.rollback()
+
+    product = _get_product_or_404(db, product_id)
+    inventory_service.apply_change(db, before, inventory_service.contribution(product))
+    return _publish_and_commit(db, product)
+
+
 def create_product(db: Session, product_in: schemas.ProductCreate) -> models.Product:
     _get_category_or_404(db, product_in.category_id)
 
@@ -50,6 +182,16 @@ def create_product(db: Session, product_in: schemas.ProductCreate) -> models.Pro
     )
 
     db.add(db_product)
+    db.flush()
+    inventory_service.apply_change(db, None, inventory_service.contribution(db_product))
+    invalidation_bus.publish(
+        db,
+        "product",
+        db_product.product_id,
+        db_product.version,
+        "create",
+        db_product.event_payload(),
+    )
     db.commit()
     db.refresh(db_product)
     return db_product
@@ -60,109 +202,331 @@ def get_products(
     skip: int = 0,
     limit: int = 100,
     include_inactive: bool = False,
-) -> Sequence[models.Product]:
-    query = db.query(models.Product).options(joinedload(models.Product.category))
-    
-    if not include_inactive:
-        query = query.filter(models.Product.active.is_(True))
-    
-    query = query.offset(skip).limit(limit)
-    return query.all()
+    expand_category: bool = False,
+) -> Sequence[schemas.Product]:
+    # La categoría solo se une (JOIN) si el cliente la pide con expand=category.
+    schema = schemas.ProductExpanded if expand_category else schemas.Product
+
+    def load() -> list[schemas.Product]:
+        query = db.query(models.Product)
+        if expand_category:
+            query = query.options(joinedload(models.Product.category))
+        
+        if not include_inactive:
+            query = query.filter(models.Product.active.is_(True))
+        
+        query = query.offset(skip).limit(limit)
+        return [schema.model_validate(product) for product in query.all()]
+
+    key = ("products", read_bind_key(db), skip, limit, include_inactive, expand_category)
+    return read_coalescer.do(key, load)
+
+
+def _encode_sync_token(changed_at: datetime, product_id: int) -> str:
+    raw = f"{changed_at.isoformat()}|{product_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_sync_token(token: str) -> tuple[datetime, int]:
+    try:
+        changed_at, product_id = base64.urlsafe_b64decode(token.encode()).decode().split("|")
+        return datetime.fromisoformat(changed_at), int(product_id)
+    except ValueError as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="El token de sincronización no es válido.",
+        ) from exc
+
+
+def _timestamp_param(value: datetime) -> str:
+    # Se compara como texto 'YYYY-MM-DD HH:MM:SS': MySQL lo convierte sin
+    # problema y SQLite guarda así los TIMESTAMP, de modo que la igualdad del
+    # cursor funciona en ambos.
+    return value.isoformat(sep=" ")
+
+
+def get_product_changes(
+    db: Session, since: str | None = None, limit: int = 500
+) -> schemas.ProductChanges:
+    """Cambios de productos (incluidos los eliminados) posteriores al token.
+
+    El cursor es `(updated_at, product_id)` para productos y
+    `(deleted_at, product_id)` para eliminados; ambas listas se mezclan en ese
+    orden. Sin token se devuelve el catálogo completo, página a página.
+    """
+    # Los cambios más recientes que `sync_settle_seconds` se dejan para la
+    # siguiente llamada: una transacción lenta aún podría confirmar filas con
+    # ese mismo `updated_at`.
+    horizon = db.query(func.now()).scalar() - timedelta(
+        seconds=settings.sync_settle_seconds
+    )
+    cursor = _decode_sync_token(since) if since else None
+
+    def _after_cursor(query, changed_at_column, id_column):
+        query = query.filter(changed_at_column < _timestamp_param(horizon))
+        if cursor is not None:
+            changed_at, product_id = (_timestamp_param(cursor[0]), cursor[1])
+            query = query.filter(
+                or_(
+                    changed_at_column > changed_at,
+                    and_(changed_at_column == changed_at, id_column > product_id),
+                )
+            )
+        return query.order_by(changed_at_column.asc(), id_column.asc()).limit(limit)
+
+    products = _after_cursor(
+        db.query(models.Product),
+        models.Product.updated_at,
+        models.Product.product_id,
+    ).all()
+    tombstones = _after_cursor(
+        db.query(models.ProductTombstone),
+        models.ProductTombstone.deleted_at,
+        models.ProductTombstone.product_id,
+    ).all()
+
+    merged = sorted(
+        [(product.updated_at, product.product_id, product) for product in products]
+        + [(tombstone.deleted_at, tombstone.product_id, None) for tombstone in tombstones],
+        key=lambda item: (item[0], item[1]),
+    )
+    page = merged[:limit]
+
+    if page:
+        last_changed_at, last_product_id, _ = page[-1]
+        next_token = _encode_sync_token(last_changed_at, last_product_id)
+    else:
+        next_token = since
+
+    return schemas.ProductChanges(
+        changes=[product for _, _, product in page if product is not None],
+        deleted=[product_id for _, product_id, product in page if product is None],
+        next_token=next_token,
+        has_more=len(merged) > limit or len(products) == limit or len(tombstones) == limit,
+    )
+
+
+def get_catalog_snapshot(db: Session) -> schemas.CatalogSnapshot:
+    """Todos los productos activos más el token para seguir con `get_product_changes`.
+
+    El token apunta a `sync_settle_seconds` antes de la lectura: lo que cambie
+    después (o se confirme tarde) llegará por la sincronización incremental,
+    aunque alguno ya venga en el snapshot.
+    """
+    horizon = db.query(func.now()).scalar() - timedelta(
+        seconds=settings.sync_settle_seconds
+    )
+    products = (
+        db.query(models.Product)
+        .filter(models.Product.active.is_(True))
+        .order_by(models.Product.product_id.asc())
+        .all()
+    )
+    return schemas.CatalogSnapshot(
+        next_token=_encode_sync_token(horizon, 0),
+        products=[schemas.Product.model_validate(product) for product in products],
+    )
 
 
-def get_product(db: Session, product_id: int) -> models.Product:
-    return _get_product_or_404(db, product_id)
+def _with_pending_stock(product: schemas.Product) -> schemas.Product:
+    """Suma al stock los incrementos aceptados que aún están en el buffer."""
+    pending = stock_buffer.pending_delta(product.product_id)
+    if pending:
+        return product.model_copy(update={"stock": product.stock + pending})
+    return product
+
+
+def get_product(
+    db: Session,
+    product_id: int,
+    include_pending: bool = False,
+    expand_category: bool = False,
+) -> schemas.Product:
+    schema = schemas.ProductExpanded if expand_category else schemas.Product
+
+    def load() -> schemas.Product:
+        return schema.model_validate(
+            _get_product_or_404(db, product_id, with_category=expand_category)
+        )
+
+    key = ("product", read_bind_key(db), product_id, expand_category)
+    product = read_coalescer.do(key, load)
+    if include_pending and stock_buffer.enabled:
+        return _with_pending_stock(product)
+    return product
 
 
 def update_product(
     db: Session,
     product_id: int,
     product_update: schemas.ProductUpdate,
+    expected_version: int | None = None,
 ) -> models.Product:
-    product = _get_product_or_404(db, product_id)
-
     update_data = product_update.model_dump(exclude_unset=True)
 
-    if "category_id" in update_data:
-        _get_category_or_404(db, update_data["category_id"])
-
+    values = {}
     for field, value in update_data.items():
         if field == "imagen_url" and value is not None:
-            setattr(product, field, str(value))
+            values[field] = str(value)
         elif field == "price" and value is not None:
-            setattr(product, field, Decimal(value))
+            values[field] = Decimal(value)
         else:
-            setattr(product, field, value)
+            values[field] = value
 
-    db.add(product)
-    db.commit()
-    db.refresh(product)
-    return product
+    return _update_and_track_inventory(db, product_id, values, expected_version)
 
 
-def increase_stock(db: Session, product_id: int, quantity: int) -> models.Product:
-    product = _get_product_or_404(db, product_id)
+def _ensure_stock_editable(product: models.Product) -> None:
     if not product.active:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="No es posible modificar el stock de un producto inactivo.",
         )
-    product.stock += quantity
-    db.add(product)
-    db.commit()
-    db.refresh(product)
+
+
+def increase_stock(
+    db: Session, product_id: int, quantity: int
+) -> models.Product | schemas.Product:
+    if stock_buffer.enabled:
+        product = _get_product_or_404(db, product_id)
+        _ensure_stock_editable(product)
+        # Se confirma en cuanto queda en el diario; el hilo de volcado lo aplica.
+        stock_buffer.enqueue(product_id, quantity)
+        return _with_pending_stock(schemas.Product.model_validate(product))
+
+    # Incremento atómico en la BD: no se pierden sumas concurrentes.
+    updated = (
+        db.query(models.Product)
+        .filter(
+            models.Product.product_id == product_id,
+            models.Product.active.is_(True),
+        )
+        .update(
+            {
+                "stock": models.Product.stock + quantity,
+                "version": models.Product.version + 1,
+            },
+            synchronize_session=False,
+        )
+    )
+    if not updated:
+        _ensure_stock_editable(_get_product_or_404(db, product_id))
+    product = _get_product_or_404(db, product_id)
+    after = inventory_service.contribution(product)
+    inventory_service.apply_change(
+        db, inventory_service.with_stock_delta(after, quantity), after
+    )
+    return _publish_and_commit(db, product)
+
+
+def _toggle_active(db: Session, product_id: int, active: bool) -> models.Product | None:
+    """Cambia `active` solo si aún tiene el valor contrario (None si no).
+
+    Es condicional para que dos peticiones simultáneas no apliquen dos veces
+    el mismo cambio al resumen de inventario.
+    """
+    updated = (
+        db.query(models.Product)
+        .filter(
+            models.Product.product_id == product_id,
+            models.Product.active.is_(not active),
+        )
+        .update(
+            {"active": active, "version": models.Product.version + 1},
+            synchronize_session=False,
+        )
+    )
+    product = _get_product_or_404(db, product_id)
+    if not updated:
+        return None
+    after = inventory_service.contribution(product)
+    inventory_service.apply_change(
+        db, inventory_service.with_active_toggled(after), after
+    )
     return product
 
 
 def deactivate_product(db: Session, product_id: int) -> models.Product:
-    product = _get_product_or_404(db, product_id)
-    if not product.active:
+    product = _toggle_active(db, product_id, active=False)
+    if product is None:
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
             detail="El producto ya se encuentra inactivo.",
         )
-    product.active = False
-    db.add(product)
-    db.commit()
-    db.refresh(product)
-    return product
+    return _publish_and_commit(db, product)
 
 
 def activate_product(db: Session, product_id: int) -> models.Product:
-    product = _get_product_or_404(db, product_id)
-    if product.active:
+    product = _toggle_active(db, product_id, active=True)
+    if product is None:
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
             detail="El producto ya se encuentra activo.",
         )
-    product.active = True
-    db.add(product)
-    db.commit()
-    db.refresh(product)
-    return product
+    return _publish_and_commit(db, product)
 
 
 def put_product(
-    db: Session, product_id: int, product_in: schemas.ProductCreate
+    db: Session,
+    product_id: int,
+    product_in: schemas.ProductCreate,
+    expected_version: int | None = None,
 ) -> models.Product:
     """Actualiza completamente un producto (PUT)"""
-    product = _get_product_or_404(db, product_id)
-    _get_category_or_404(db, product_in.category_id)
+    values = {
+        "name": product_in.name,
+        "description": product_in.description,
+        "price": Decimal(product_in.price),
+        "imagen_url": str(product_in.imagen_url) if product_in.imagen_url else None,
+        "category_id": product_in.category_id,
+    }
 
-    product.name = product_in.name
-    product.description = product_in.description
-    product.price = Decimal(product_in.price)
-    product.imagen_url = str(product_in.imagen_url) if product_in.imagen_url else None
-    product.category_id = product_in.category_id
+    return _update_and_track_inventory(db, product_id, values, expected_version)
 
-    db.add(product)
-    db.commit()
-    db.refresh(product)
-    return product
+
+def set_product_image(
+    db: Session,
+    product_id: int,
+    upload: BinaryIO,
+    base_url: str,
+    expected_version: int | None = None,
+) -> models.Product:
+    """Guarda la imagen subida y apunta `imagen_url` a su variante local.
+
+    La imagen se valida y procesa antes de tocar la BD para no retener una
+    conexión del pool mientras se generan las miniaturas; si el producto no
+    existe, el `UPDATE` no encuentra la fila y se responde 404.
+    """
+    digest = image_service.store_image(image_service.read_upload(upload))
+
+    values = {"imagen_url": image_service.image_url(base_url, digest)}
+    _update_product_row(db, product_id, values, expected_version)
+    return _publish_and_commit(db, _get_product_or_404(db, product_id))
 
 
 def delete_product(db: Session, product_id: int) -> None:
     """Elimina físicamente un producto de la base de datos"""
-    product = _get_product_or_404(db, product_id)
-    db.delete(product)
+    before = inventory_service.lock_contribution(db, product_id)
+    if before is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Producto con id {product_id} no encontrado.",
+        )
+    db.query(models.Product).filter(models.Product.product_id == product_id).delete(
+        synchronize_session=False
+    )
+    inventory_service.apply_change(db, before, None)
+    # La marca de borrado avisa a los clientes que sincronizan por cambios.
+    db.query(models.ProductTombstone).filter(
+        models.ProductTombstone.product_id == product_id
+    ).delete(synchronize_session=False)
+    db.add(models.ProductTombstone(product_id=product_id))
+    invalidation_bus.publish(
+        db,
+        "product",
+        product_id,
+        None,
+        "delete",
+        {"product_id": product_id, "category_id": before.category_id},
+    )
     db.commit()
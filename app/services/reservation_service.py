@@ -0,0 +1,241 @@
+import time
+
+from fastapi import HTTPException, status
+from sqlalchemy.orm import Session
+
+from .. import models, schemas
+from ..config import settings
+from ..database import in_lock_order
+from ..invalidation import invalidation_bus
+from . import inventory_service
+
+_HELD = "held"
+
+
+def _get_reservation_or_404(db: Session, reservation_id: int) -> models.StockReservation:
+    reservation = db.get(models.StockReservation, reservation_id)
+    if reservation is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Reserva con id {reservation_id} no encontrada.",
+        )
+    return reservation
+
+
+def _publish_stock_change(db: Session, product: models.Product, quantity: int) -> None:
+    """Ajusta el resumen de inventario y avisa del nuevo stock por el bus."""
+    after = inventory_service.contribution(product)
+    inventory_service.apply_change(
+        db, inventory_service.with_stock_delta(after, quantity), after
+    )
+    invalidation_bus.publish(
+        db,
+        "product",
+        product.product_id,
+        product.version,
+        data=product.event_payload(),
+    )
+
+
+def _return_stock(db: Session, quantities: dict[int, int]) -> None:
+    """Devuelve a cada producto las unidades de reservas que no se confirmaron."""
+    for product_id, quantity in in_lock_order(quantities):
+        db.query(models.Product).filter(
+            models.Product.product_id == product_id
+        ).update(
+            {
+                "stock": models.Product.stock + quantity,
+                "version": models.Product.version + 1,
+            },
+            synchronize_session=False,
+        )
+    products = db.query(models.Product).filter(
+        models.Product.product_id.in_(quantities)
+    )
+    for product in products:
+        _publish_stock_change(db, product, quantities[product.product_id])
+
+
+def reserve_stock(
+    db: Session, reservation_in: schemas.StockReservationCreate
+) -> models.StockReservation:
+    """Aparta unidades con un único `UPDATE` condicional, sin leer antes el stock.
+
+    Si no hay stock suficiente no se actualiza ninguna fila y se responde 409:
+    nunca se vende más de lo que hay, sin bloquear la tabla.
+    """
+    ttl = reservation_in.ttl_seconds or settings.reservation_default_ttl_seconds
+    if ttl > settings.reservation_max_ttl_seconds:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"La reserva no puede durar más de {settings.reservation_max_ttl_seconds} segundos.",
+        )
+
+    product_id = reservation_in.product_id
+    quantity = reservation_in.quantity
+    # Primero el UPDATE (bloqueo exclusivo de la fila) y después el INSERT de
+    # la reserva: al revés, el bloqueo compartido que toma la clave foránea
+    # provoca deadlocks entre checkouts simultáneos del mismo producto.
+    updated = (
+        db.query(models.Product)
+        .filter(
+            models.Product.product_id == product_id,
+            models.Product.active.is_(True),
+            models.Product.stock >= quantity,
+        )
+        .update(
+            {
+                "stock": models.Product.stock - quantity,
+                "version": models.Product.version + 1,
+            },
+            synchronize_session=False,
+        )
+    )
+    product = (
+        db.query(models.Product).filter(models.Product.product_id == product_id).first()
+    )
+    if product is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Producto con id {product_id} no encontrado.",
+        )
+    if not updated:
+        if not product.active:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="No es posible reservar stock de un producto inactivo.",
+            )
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Stock insuficiente: quedan {product.stock} unidad(es) disponibles.",
+        )
+
+    reservation = models.StockReservation(
+        product_id=product_id,
+        quantity=quantity,
+        status=_HELD,
+        expires_at=time.time() + ttl,
+    )
+    db.add(reservation)
+    _publish_stock_change(db, product, -quantity)
+    db.commit()
+    db.refresh(reservation)
+    return reservation
+
+
+def get_reservation(db: Session, reservation_id: int) -> models.StockReservation:
+    return _get_reservation_or_404(db, reservation_id)
+
+
+def _close_reservation(
+    db: Session, reservation_id: int, new_status: str, require_unexpired: bool
+) -> bool:
+    """Pasa la reserva de `held` a `new_status`; False si ya no estaba retenida."""
+    now = time.time()
+    query = db.query(models.StockReservation).filter(
+        models.StockReservation.reservation_id == reservation_id,
+        models.StockReservation.status == _HELD,
+    )
+    if require_unexpired:
+        query = query.filter(models.StockReservation.expires_at > now)
+    return bool(
+        query.update({"status": new_status, "closed_at": now}, synchronize_session=False)
+    )
+
+
+def _raise_not_held(reservation: models.StockReservation) -> None:
+    if reservation.status == _HELD:
+        detail = "La reserva caducó; sus unidades se devolverán al stock."
+    else:
+        detail = f"La reserva ya no está retenida (estado: {reservation.status})."
+    raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=detail)
+
+
+def commit_reservation(db: Session, reservation_id: int) -> models.StockReservation:
+    """Confirma la venta: las unidades ya descontadas no se devuelven."""
+    if not _close_reservation(db, reservation_id, "committed", require_unexpired=True):
+        _raise_not_held(_get_reservation_or_404(db, reservation_id))
+    db.commit()
+    return _get_reservation_or_404(db, reservation_id)
+
+
+def release_reservation(db: Session, reservation_id: int) -> models.StockReservation:
+    """Cancela la reserva y devuelve sus unidades al producto."""
+    reservation = _get_reservation_or_404(db, reservation_id)
+    if not _close_reservation(db, reservation_id, "released", require_unexpired=False):
+        db.refresh(reservation)
+        _raise_not_held(reservation)
+    _return_stock(db, {reservation.product_id: reservation.quantity})
+    db.commit()
+    db.refresh(reservation)
+    return reservation
+
+
+def expire_reservations(db: Session, batch_size: int) -> int:
+    """Caduca un lote de reservas vencidas y devuelve su stock en una transacción.
+
+    Devuelve cuántas reservas caducó. Con `SKIP LOCKED` (MySQL 8) varios
+    workers pueden barrer a la vez sin pisarse.
+    """
+    now = time.time()
+    rows = (
+        db.query(
+            models.StockReservation.reservation_id,
+            models.StockReservation.product_id,
+            models.StockReservation.quantity,
+        )
+        .filter(
+            models.StockReservation.status == _HELD,
+            models.StockReservation.expires_at <= now,
+        )
+        .order_by(models.StockReservation.expires_at.asc())
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    if not rows:
+        db.rollback()
+        return 0
+
+    expired = (
+        db.query(models.StockReservation)
+        .filter(
+            models.StockReservation.reservation_id.in_([row.reservation_id for row in rows]),
+            models.StockReservation.status == _HELD,
+        )
+        .update({"status": "expired", "closed_at": now}, synchronize_session=False)
+    )
+    if expired != len(rows):
+        # Alguna se confirmó o liberó entre medias (motores sin bloqueo de
+        # filas): se deshace el lote para no devolver stock de más.
+        db.rollback()
+        return 0
+
+    quantities: dict[int, int] = {}
+    for row in rows:
+        quantities[row.product_id] = quantities.get(row.product_id, 0) + row.quantity
+    _return_stock(db, quantities)
+    db.commit()
+    return expired
+
+
+def purge_closed_reservations(db: Session, older_than: float, batch_size: int) -> int:
+    """Borra un lote de reservas cerradas antes de `older_than` (epoch)."""
+    ids = [
+        reservation_id
+        for (reservation_id,) in db.query(models.StockReservation.reservation_id)
+        .filter(
+            models.StockReservation.status != _HELD,
+            models.StockReservation.closed_at < older_than,
+        )
+        .limit(batch_size)
+    ]
+    if not ids:
+        return 0
+    deleted = (
+        db.query(models.StockReservation)
+        .filter(models.StockReservation.reservation_id.in_(ids))
+        .delete(synchronize_session=False)
+    )
+    db.commit()
+    return deleted
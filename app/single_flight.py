@@ -0,0 +1,82 @@
+"""Agrupación de lecturas idénticas concurrentes ("single flight").
+
+Cuando llegan a la vez muchas peticiones con la misma consulta, solo la primera
+la ejecuta contra la BD; las demás esperan y reciben el mismo resultado ya
+serializado (esquemas Pydantic, nunca objetos ORM ligados a una sesión).
+"""
+
+import copy
+import threading
+from collections.abc import Callable, Hashable
+from typing import Any
+
+from sqlalchemy.orm import Session
+
+
+class _InFlightCall:
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException | None = None
+
+
+class SingleFlight:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._calls: dict[Hashable, _InFlightCall] = {}
+        self._executions = 0
+        self._shared = 0
+
+    def do(self, key: Hashable, load: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _InFlightCall()
+                self._calls[key] = call
+                self._executions += 1
+            else:
+                self._shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                # Copia para no compartir el traceback entre hilos, marcada
+                # para que el error no se cuente otra vez (ver is_shared_error).
+                error = copy.copy(call.error)
+                error.single_flight_shared = True
+                raise error
+            return call.result
+
+        try:
+            call.result = load()
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "in_flight": len(self._calls),
+                "executions": self._executions,
+                "shared": self._shared,
+            }
+
+
+def is_shared_error(exc: BaseException) -> bool:
+    """True si el error es la copia que recibió una petición que esperaba a otra."""
+    return getattr(exc, "single_flight_shared", False)
+
+
+def read_bind_key(db: Session) -> int:
+    """Distingue la BD de la sesión: una lectura de la réplica no debe servir
+    a quien necesita leer de la principal (read-your-writes)."""
+    return id(db.get_bind())
+
+
+read_coalescer = SingleFlight()
@@ -0,0 +1,281 @@
+"""Buffer de incrementos de stock con diario local.
+
+Cuando `stock_buffer_enabled` está activo, cada `increase_stock` se escribe
+(con fsync) en un diario de solo-añadir propio del proceso y se confirma al
+cliente. Un hilo de fondo agrupa los incrementos por `product_id` y los aplica
+con un único `UPDATE` por producto en cada intervalo, registrando en la misma
+transacción hasta qué entrada del diario se ha aplicado.
+
+Si un proceso muere con incrementos pendientes, el siguiente que arranque
+reproduce su diario a partir de ese punto de control (aunque entretanto se
+haya desactivado el buffer: los incrementos ya se confirmaron al cliente).
+Los incrementos de productos desactivados antes del volcado se descartan,
+igual que los rechaza `increase_stock` sin buffer.
+"""
+
+import os
+import threading
+import time
+
+from sqlalchemy import update
+
+from . import models
+from .config import settings
+from .database import SessionLocal, in_lock_order
+from .file_io import lock_file
+from .invalidation import invalidation_bus
+from .services import inventory_service
+
+def _still_linked(path: str, journal_file) -> bool:
+    """True si `path` sigue siendo el archivo abierto (no se borró ni reemplazó)."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return False
+    opened = os.fstat(journal_file.fileno())
+    return (stat.st_dev, stat.st_ino) == (opened.st_dev, opened.st_ino)
+
+
+def _apply_deltas(journal: str, deltas: dict[int, int], last_seq: int) -> None:
+    """Aplica los incrementos y mueve el punto de control en una transacción."""
+    db = SessionLocal()
+    try:
+        applied = []
+        for product_id, quantity in in_lock_order(deltas):
+            result = db.execute(
+                update(models.Product)
+                .where(
+                    models.Product.product_id == product_id,
+                    models.Product.active.is_(True),
+                )
+                .values(
+                    stock=models.Product.stock + quantity,
+                    version=models.Product.version + 1,
+                )
+            )
+            if result.rowcount:
+                applied.append(product_id)
+            else:
+                print(
+                    f"--> Descartado un incremento de stock de {quantity} para el producto "
+                    f"{product_id}: está inactivo o ya no existe ({journal})"
+                )
+        products = db.query(models.Product).filter(
+            models.Product.product_id.in_(applied)
+        )
+        inventory_changes = []
+        for product in products:
+            after = inventory_service.contribution(product)
+            inventory_changes.append(
+                (inventory_service.with_stock_delta(after, deltas[product.product_id]), after)
+            )
+            invalidation_bus.publish(
+                db,
+                "product",
+                product.product_id,
+                product.version,
+                data=product.event_payload(),
+            )
+        inventory_service.apply_changes(db, inventory_changes)
+
+        checkpoint = db.get(models.StockJournalCheckpoint, journal)
+        if checkpoint is None:
+            db.add(models.StockJournalCheckpoint(journal=journal, last_seq=last_seq))
+        else:
+            checkpoint.last_seq = last_seq
+        db.commit()
+    finally:
+        db.close()
+
+
+def _forget_checkpoint(journal: str) -> None:
+    db = SessionLocal()
+    try:
+        db.query(models.StockJournalCheckpoint).filter(
+            models.StockJournalCheckpoint.journal == journal
+        ).delete()
+        db.commit()
+    finally:
+        db.close()
+
+
+class StockBuffer:
+    def __init__(self) -> None:
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending: dict[int, int] = {}
+        self._flushing: dict[int, int] = {}
+        self._pending_count = 0
+        self._seq = 0
+        self._journal_name: str | None = None
+        self._journal_path: str | None = None
+        self._journal_file = None
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    # --- Ciclo de vida ---
+
+    def start(self) -> None:
+        journal_dir = settings.stock_buffer_journal_dir
+        os.makedirs(journal_dir, exist_ok=True)
+
+        self._journal_name = f"stock-{os.getpid()}-{time.time_ns()}.log"
+        self._journal_path = os.path.join(journal_dir, self._journal_name)
+        # Se crea con un nombre que la recuperación no reconoce y se bloquea
+        # antes de renombrarlo: otro worker que arranque a la vez nunca lo ve
+        # sin bloqueo (y no lo toma por huérfano). El bloqueo se mantiene
+        # mientras el proceso vive.
+        creating_path = os.path.join(journal_dir, f".{self._journal_name}.tmp")
+        self._journal_file = open(creating_path, "ab")
+        lock_file(self._journal_file)
+        os.rename(creating_path, self._journal_path)
+
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="stock-buffer-flusher", daemon=True
+        )
+        self._thread.start()
+        self.enabled = True
+
+    def stop(self) -> None:
+        """Vuelca todo lo pendiente antes de apagar el proceso."""
+        if not self.enabled:
+            return
+        self.enabled = False
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+
+        try:
+            self.flush()
+        except Exception as exc:
+            print(f"--> Error al volcar el buffer de stock al apagar: {exc}")
+        with self._lock:
+            fully_applied = not self._pending
+            self._journal_file.close()
+        if fully_applied:
+            os.remove(self._journal_path)
+            _forget_checkpoint(self._journal_name)
+        else:
+            print(
+                f"--> Quedan incrementos de stock sin aplicar en {self._journal_path}; "
+                "se reproducirán en el próximo arranque."
+            )
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wakeup.wait(settings.stock_buffer_flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as exc:
+                print(f"--> Error al volcar el buffer de stock, se reintentará: {exc}")
+
+    # --- Escritura y lectura ---
+
+    def enqueue(self, product_id: int, quantity: int) -> None:
+        """Registra un incremento de forma durable antes de confirmarlo."""
+        with self._lock:
+            self._seq += 1
+            self._journal_file.write(f"{self._seq} {product_id} {quantity}\n".encode())
+            self._journal_file.flush()
+            os.fsync(self._journal_file.fileno())
+            self._pending[product_id] = self._pending.get(product_id, 0) + quantity
+            self._pending_count += 1
+            if self._pending_count >= settings.stock_buffer_max_pending:
+                self._wakeup.set()
+
+    def pending_delta(self, product_id: int) -> int:
+        """Incremento aceptado por este proceso que aún no está en la BD."""
+        with self._lock:
+            return self._pending.get(product_id, 0) + self._flushing.get(product_id, 0)
+
+    def flush(self) -> int:
+        """Aplica los incrementos pendientes. Devuelve cuántos productos tocó."""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                batch, self._pending = self._pending, {}
+                self._flushing = batch
+                self._pending_count = 0
+                last_seq = self._seq
+
+            try:
+                _apply_deltas(self._journal_name, batch, last_seq)
+            except Exception:
+                with self._lock:
+                    for product_id, quantity in batch.items():
+                        self._pending[product_id] = (
+                            self._pending.get(product_id, 0) + quantity
+                        )
+                    self._pending_count += len(batch)
+                    self._flushing = {}
+                raise
+
+            with self._lock:
+                self._flushing = {}
+                # Si no entró nada nuevo, todo el diario ya está aplicado.
+                if self._seq == last_seq:
+                    self._journal_file.truncate(0)
+            return len(batch)
+
+    # --- Recuperación ---
+
+    def recover(self) -> None:
+        """Reproduce los diarios de procesos que murieron con incrementos pendientes.
+
+        Se llama en cada arranque, esté o no activo el buffer.
+        """
+        journal_dir = settings.stock_buffer_journal_dir
+        if not os.path.isdir(journal_dir):
+            return
+        for filename in sorted(os.listdir(journal_dir)):
+            if not (filename.startswith("stock-") and filename.endswith(".log")):
+                continue
+            path = os.path.join(journal_dir, filename)
+            try:
+                journal_file = open(path, "rb")
+            except FileNotFoundError:
+                continue  # Otro worker lo recuperó entre medias.
+            with journal_file:
+                if not lock_file(journal_file, blocking=False):
+                    continue  # Pertenece a un worker vivo.
+                if not _still_linked(path, journal_file):
+                    continue  # Otro worker lo recuperó y borró antes del bloqueo.
+                deltas, last_seq = self._read_journal(filename, journal_file)
+                if deltas:
+                    _apply_deltas(filename, deltas, last_seq)
+                    print(f"--> Reproducido el diario de stock {filename} ({len(deltas)} producto(s))")
+                # Con el bloqueo aún tomado: primero el archivo y luego el punto
+                # de control, para que nadie lo reproduzca desde cero.
+                os.remove(path)
+                _forget_checkpoint(filename)
+
+    @staticmethod
+    def _read_journal(journal: str, journal_file) -> tuple[dict[int, int], int]:
+        db = SessionLocal()
+        try:
+            checkpoint = db.get(models.StockJournalCheckpoint, journal)
+            applied_seq = checkpoint.last_seq if checkpoint is not None else 0
+        finally:
+            db.close()
+
+        deltas: dict[int, int] = {}
+        last_seq = applied_seq
+        for line in journal_file:
+            try:
+                seq, product_id, quantity = (int(part) for part in line.split())
+            except ValueError:
+                continue  # Línea incompleta por una caída a mitad de escritura.
+            if seq <= applied_seq:
+                continue
+            deltas[product_id] = deltas.get(product_id, 0) + quantity
+            last_seq = max(last_seq, seq)
+        return deltas, last_seq
+
+
+stock_buffer = StockBuffer()
@@ -0,0 +1,114 @@
+"""Benchmark de la agrupación de lecturas idénticas (single flight).
+
+Lanza a la vez N peticiones iguales contra la aplicación (transporte ASGI, sin
+servidor) y cuenta los `SELECT` que llegan a la BD, con y sin agrupación. Cada
+`SELECT` tarda una latencia simulada para que las peticiones se solapen como
+con una BD real.
+
+Uso (desde la raíz del proyecto):
+
+    python -m scripts.bench_read_coalescing [--requests 200] [--latency-ms 20]
+
+Por defecto usa una BD SQLite temporal; con DATABASE_URL se mide contra otra.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _prepare_environment(workdir: str) -> None:
+    # Antes de importar la aplicación: la configuración se lee al importarla.
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{workdir}/bench.db")
+    os.environ.setdefault("JWT_SECRET", "benchmark-secret-no-usar-en-produccion")
+    os.environ.setdefault("JWT_EXPIRES_IN", "1d")
+    os.environ.setdefault("CATALOG_SNAPSHOT_ENABLED", "false")
+    os.environ.setdefault("ADMISSION_READ_QUEUE", "1000")
+    os.environ.setdefault("ADMISSION_QUEUE_TIMEOUT", "60")
+    sys.path.insert(0, _ROOT)
+    os.chdir(workdir)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--products", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        _prepare_environment(workdir)
+        _run(args)
+
+
+def _run(args) -> None:
+    import httpx
+    from fastapi.testclient import TestClient
+    from sqlalchemy import event
+
+    from app import models, single_flight
+    from app.database import SessionLocal, engine
+    from app.main import app
+
+    with TestClient(app):  # Arranque completo (lifespan) antes de medir.
+        db = SessionLocal()
+        category = models.Category(name=f"Benchmark {time.time()}")
+        db.add(category)
+        db.flush()
+        for i in range(args.products):
+            db.add(models.Product(
+                name=f"Producto {i}", price=1, stock=10, active=True,
+                category_id=category.category_id,
+            ))
+        db.commit()
+        product_id = db.query(models.Product.product_id).first()[0]
+        db.close()
+
+        selects = 0
+        latency = args.latency_ms / 1000
+
+        def count_select(conn, cursor, statement, *rest) -> None:
+            nonlocal selects
+            if statement.lstrip()[:6].upper() == "SELECT":
+                selects += 1
+                time.sleep(latency)
+
+        event.listen(engine, "before_cursor_execute", count_select)
+
+        async def burst(path: str) -> tuple[int, float]:
+            nonlocal selects
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                selects = 0
+                started = time.perf_counter()
+                responses = await asyncio.gather(
+                    *[client.get(path) for _ in range(args.requests)]
+                )
+                elapsed_ms = (time.perf_counter() - started) * 1000
+            failed = [r.status_code for r in responses if r.status_code != 200]
+            if failed:
+                raise SystemExit(f"{path}: respuestas con error {sorted(set(failed))}")
+            return selects, elapsed_ms
+
+        paths = (f"/products/{product_id}", "/products/", "/categories/")
+        coalesce = single_flight.read_coalescer.do
+        for label in ("agrupadas", "sin agrupar"):
+            if label == "sin agrupar":
+                single_flight.read_coalescer.do = lambda key, load: load()
+            for path in paths:
+                count, elapsed_ms = asyncio.run(burst(path))
+                print(
+                    f"{label:12} {path:14} {args.requests} peticiones -> "
+                    f"{count:4d} SELECT, {elapsed_ms:7.0f} ms"
+                )
+        single_flight.read_coalescer.do = coalesce
+        event.remove(engine, "before_cursor_execute", count_select)
+
+
+if __name__ == "__main__":
+    main()
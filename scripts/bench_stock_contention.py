@@ -0,0 +1,143 @@
+"""Benchmark de contención sobre el stock de un producto muy vendido.
+
+Varios hilos intentan a la vez descontar una unidad de un mismo producto y se
+comparan dos estrategias:
+
+- leer-modificar-escribir: se lee el stock, se comprueba y se guarda el nuevo
+  valor (el patrón que se sustituyó; puede vender más de lo que hay).
+- UPDATE condicional: `reservation_service.reserve_stock`, un único `UPDATE`
+  con `stock >= cantidad` en el WHERE.
+
+Uso (desde la raíz del proyecto):
+
+    python -m scripts.bench_stock_contention [--threads 32] [--attempts 40] [--stock 500]
+
+Por defecto usa una BD SQLite temporal; con DATABASE_URL se mide contra otra
+(MySQL da la cifra representativa de bloqueos de fila).
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _prepare_environment(workdir: str) -> None:
+    # Antes de importar la aplicación: la configuración se lee al importarla.
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{workdir}/bench.db")
+    os.environ.setdefault("JWT_SECRET", "benchmark-secret-no-usar-en-produccion")
+    os.environ.setdefault("JWT_EXPIRES_IN", "1d")
+    os.environ.setdefault("CATALOG_SNAPSHOT_ENABLED", "false")
+    sys.path.insert(0, _ROOT)
+    os.chdir(workdir)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--attempts", type=int, default=40)
+    parser.add_argument("--stock", type=int, default=500)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        _prepare_environment(workdir)
+        _run(args)
+
+
+def _run(args) -> None:
+    from fastapi import HTTPException
+    from sqlalchemy.exc import OperationalError
+
+    import app.main  # noqa: F401  (crea las tablas)
+    from app import models, schemas
+    from app.database import SessionLocal
+    from app.services import reservation_service
+
+    def create_product() -> int:
+        db = SessionLocal()
+        try:
+            category = models.Category(name=f"Benchmark {time.time()}")
+            db.add(category)
+            db.flush()
+            product = models.Product(
+                name="Muy vendido", price=1, stock=args.stock, active=True,
+                category_id=category.category_id,
+            )
+            db.add(product)
+            db.commit()
+            return product.product_id
+        finally:
+            db.close()
+
+    def read_modify_write(db, product_id: int) -> None:
+        product = db.get(models.Product, product_id)
+        if product.stock < 1:
+            raise HTTPException(status_code=409)
+        time.sleep(0)  # Cede el GIL entre la lectura y la escritura.
+        product.stock -= 1
+        db.commit()
+
+    def conditional_update(db, product_id: int) -> None:
+        reservation_service.reserve_stock(
+            db, schemas.StockReservationCreate(product_id=product_id, quantity=1)
+        )
+
+    def measure(label: str, sell) -> None:
+        product_id = create_product()
+        results = {"ok": 0, "rejected": 0, "errors": 0}
+        latencies: list[float] = []
+        lock = threading.Lock()
+
+        def worker() -> None:
+            for _ in range(args.attempts):
+                db = SessionLocal()
+                started = time.perf_counter()
+                try:
+                    sell(db, product_id)
+                    outcome = "ok"
+                except HTTPException:
+                    outcome = "rejected"
+                except OperationalError:
+                    db.rollback()
+                    outcome = "errors"
+                finally:
+                    db.close()
+                with lock:
+                    latencies.append(time.perf_counter() - started)
+                    results[outcome] += 1
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=worker) for _ in range(args.threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - started
+
+        db = SessionLocal()
+        final_stock = db.get(models.Product, product_id).stock
+        db.close()
+        latencies.sort()
+        oversold = max(results["ok"] - args.stock, 0)
+        print(
+            f"{label:24} vendidos={results['ok']:4d} rechazados={results['rejected']:4d} "
+            f"errores={results['errors']:3d} stock_final={final_stock:4d} "
+            f"sobreventa={oversold:4d} {len(latencies) / wall:7.0f} intentos/s "
+            f"p50={latencies[len(latencies) // 2] * 1000:.1f}ms "
+            f"p99={latencies[int(len(latencies) * 0.99)] * 1000:.1f}ms"
+        )
+
+    print(
+        f"{args.threads} hilos x {args.attempts} intentos de 1 unidad "
+        f"sobre un stock de {args.stock}"
+    )
+    measure("leer-modificar-escribir", read_modify_write)
+    measure("UPDATE condicional", conditional_update)
+
+
+if __name__ == "__main__":
+    main()